@@ -3,13 +3,24 @@ import pathlib
 import dash
 import dash_bootstrap_components as dbc
 
+from controllers.static_assets import VENDOR_ASSETS, VENDOR_DIR, get_vendor_url, load_vendor_manifest
+
 PATH = pathlib.Path(__file__).parent.resolve()
 DATA_PATH = PATH.joinpath("data").resolve()
 
 EXTERNAL_STYLESHEETS = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
-FONT_AWESOME = "https://use.fontawesome.com/releases/v5.10.2/css/all.css"
-VIDEO_FRAME = "https://rawgit.com/allensarkisyan/VideoFrame/master/VideoFrame.min.js"
-JQUERY = "https://ajax.googleapis.com/ajax/libs/jquery/2.1.1/jquery.min.js"
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, FONT_AWESOME],
-                external_scripts=[VIDEO_FRAME, JQUERY],
+# VideoFrame is served from assets/VideoFrame.js, the rest from the local
+# bundle of bundle_assets.py.
+VENDOR_MANIFEST = load_vendor_manifest()
+if VENDOR_MANIFEST is not None:
+    STYLESHEETS = [get_vendor_url(VENDOR_MANIFEST, 'bootstrap.css'),
+                   get_vendor_url(VENDOR_MANIFEST, 'font-awesome.css')]
+    SCRIPTS = [get_vendor_url(VENDOR_MANIFEST, 'jquery.js')]
+else:
+    print(f"[Assets] WARNING: no {VENDOR_DIR}/manifest.json, loading bootstrap, font awesome and jquery "
+          f"from their CDNs; the pages will not load offline. Run `python bundle_assets.py` to bundle them.")
+    STYLESHEETS = [dbc.themes.BOOTSTRAP, VENDOR_ASSETS['font-awesome.css']]
+    SCRIPTS = [VENDOR_ASSETS['jquery.js']]
+app = dash.Dash(__name__, external_stylesheets=STYLESHEETS,
+                external_scripts=SCRIPTS,
                 suppress_callback_exceptions=True)
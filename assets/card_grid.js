@@ -0,0 +1,225 @@
+if(!window.dash_clientside) {window.dash_clientside = {};}
+
+// Cards of screens 0 and 1 as html templates. The server sends plain rows
+// and a page is one innerHTML instead of a Dash component tree per card.
+// Clicks and checkboxes reach the server callbacks through hidden dcc.Input
+// components, see send_to_dash.
+
+const MAX_TEXT_LENGTH = 20;
+
+// same text as a python f-string for the values of the dashboard json
+function to_text(value) {
+    return value === null || value === undefined ? 'None' : String(value);
+}
+
+function escape_html(value) {
+    return String(value === null || value === undefined ? '' : value)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+function clip_long_text(text) {
+    text = to_text(text);
+    return text.length > MAX_TEXT_LENGTH ? text.slice(0, MAX_TEXT_LENGTH) + '...' : text;
+}
+
+function get_card_color(is_done) {
+    if (is_done === 'check_true') {
+        return '#4CAF50';
+    }
+    return is_done === 'check_false' ? 'orangered' : 'gray';
+}
+
+function get_doctor_name(doctors) {
+    let doctor_name = doctors.length ? doctors[0] : '';
+    if (doctors.length > 1) {
+        doctor_name += ', ' + (doctors.length - 1) + ' others';
+    }
+    return doctor_name;
+}
+
+// the tooltips of the Dash cards are plain title attributes here
+function card_info_field(text, icon, tooltip, color) {
+    return `<div><hr><div title="${escape_html(tooltip)}"><i class="${icon}"></i>` +
+        `<p class="card-text-info" style="color: ${color || 'black'}">${escape_html(text)}</p></div></div>`;
+}
+
+function card_multi_color_field(spans, icon, tooltip) {
+    const texts = spans.map(([text, color]) => `<p class="card-text-info" style="color: ${color}">${escape_html(text)}</p>`);
+    return `<div><hr><div title="${escape_html(tooltip)}"><i class="${icon}"></i>` +
+        `<div style="display: inline">${texts.join('')}</div></div></div>`;
+}
+
+function card_dropdown_field(text, lines, icon, color) {
+    const content = lines.map(line => `<p>${escape_html(line)}</p>`).join('');
+    return `<div><hr><div class="dropdown"><i class="${icon}"></i>` +
+        `<p class="card-text-info" style="color: ${color}">${escape_html(text)}</p>` +
+        `<div class="dropdown-content">${content}</div></div></div>`;
+}
+
+function card_image_field(image_path) {
+    return `<div><div><img src="${escape_html('/screen_1/images/' + image_path)}" class="dicom-image" loading="lazy"></div></div>`;
+}
+
+function card_grid(rows, n_columns, get_card) {
+    const grid = [];
+    for (let row = 0; row <= Math.floor(rows.length / n_columns); row++) {
+        const cards = rows.slice(row * n_columns, (row + 1) * n_columns).map(get_card);
+        grid.push(`<div class="row">${cards.join('')}</div>`);
+    }
+    return `<div>${grid.join('')}</div>`;
+}
+
+function get_patient_case_card(row) {
+    const id = to_text(row.ID);
+    const total_dicom = to_text(row.NumTotalDicom);
+    const annotated_dicom = to_text(row.NumAnnotatedDicom);
+    const total_frame = to_text(row.NumTotalFrame);
+    const annotated_frame = to_text(row.NumAnnotatedFrame);
+    const doctors = row.DoctorList || [];
+    const label = row.Label || {};
+    const label_keys = Object.keys(label).sort();
+    let label_text = '';
+    if (label_keys.length) {
+        label_text = label_keys[0] + ' - ' + to_text(label[label_keys[0]]) + ' dicoms';
+    }
+    if (label_keys.length > 1) {
+        label_text += ', ...';
+    }
+    const label_tooltip = label_keys.map(key => key + ' - ' + to_text(label[key]) + ' dicoms, ').join('');
+    return `<div class="card four columns case-info-card" style="background-color: ${get_card_color(row.IsDone)}">` +
+        `<a href="${escape_html('case_id=' + id)}" style="text-decoration: none">` +
+        `<div class="card-header case-info-card-header"><p>${escape_html('Case ' + id)}</p></div></a>` +
+        '<div class="card-body case-info-card-body">' +
+        card_info_field(annotated_dicom + ' / ' + total_dicom + ' dicoms', 'fas fa-pencil-ruler',
+            annotated_dicom + ' annotated in ' + total_dicom + ' total dicoms') +
+        card_multi_color_field([
+            [to_text(row.NumApproved) + ' / ', 'green'],
+            [to_text(row.NumRejected) + ' / ', 'red'],
+            [total_dicom, 'default'],
+        ], 'fa fa-tasks', to_text(row.NumApproved) + ' approved ' + to_text(row.NumRejected) + ' rejected in ' +
+            total_dicom + ' total dicom') +
+        card_info_field(annotated_frame + ' / ' + total_frame + ' frames', 'fa fa-pen',
+            annotated_frame + ' annotated ' + total_frame + ' total frames') +
+        card_info_field(get_doctor_name(doctors), 'fas fa-fw fa-user-md', doctors.join(', ')) +
+        card_info_field(label_text, 'fas fa-fw fa-tag', label_tooltip) +
+        card_info_field(clip_long_text(row.Hospital), 'fas fa-fw fa-hospital', row.Hospital) +
+        card_info_field(clip_long_text(row.PatientName), 'fas fa-fw fa-procedures', row.PatientName) +
+        card_info_field(row.LastEdit, 'fas fa-fw fa-history',
+            'annotated: ' + to_text(row.LastEdit) + ', review: ' + to_text(row.LastReview)) +
+        '</div></div>';
+}
+
+// The select box sits outside the link so ticking it does not open the modal.
+function get_dicom_card_header(row, case_id) {
+    const dicom_id = to_text(row.FileName);
+    return '<div><div class="screen1-dicom-select">' +
+        `<label><input type="checkbox" value="${escape_html(dicom_id)}"> Select</label></div>` +
+        `<a class="screen1-open-dicom" data-case-id="${escape_html(case_id)}" data-dicom-id="${escape_html(dicom_id)}"` +
+        ' style="text-decoration: none">' +
+        `<div class="card-header case-info-card-header"><p>${escape_html('FileName:' + dicom_id)}</p></div></a></div>`;
+}
+
+function get_dicom_card(row, case_id) {
+    const total_frame = to_text(row.NumTotalFrame);
+    const annotated_frame = to_text(row.NumAnnotatedFrame);
+    const annotated_ef_frame = to_text(row.NumAnnotatedEFFrame);
+    const annotated_gls_frame = to_text(row.NumAnnotatedGLSFrame);
+    const annotated_ef_gls_frame = to_text(row.NumAnnotatedEFAndGLSFrame);
+    // [name, number of edits] pairs
+    const doctors = row.DoctorList || [];
+    return `<div class="card four columns case-info-card" style="background-color: ${get_card_color(row.IsDone)}">` +
+        get_dicom_card_header(row, case_id) +
+        '<div class="card-body case-info-card-body">' +
+        card_image_field(row.FullImagePath) +
+        card_info_field(annotated_frame + ' / ' + total_frame + ' frames', 'far fa-images',
+            annotated_frame + ' annotated in ' + total_frame + ' total dicoms') +
+        card_info_field(annotated_ef_frame + ' ef / ' + total_frame + ' frames', 'far fa-images',
+            annotated_ef_frame + ' annotated ef frames in ' + total_frame + ' total dicoms') +
+        card_info_field(annotated_gls_frame + ' gls / ' + total_frame + ' frames', 'far fa-images',
+            annotated_gls_frame + ' annotated gls frames in ' + total_frame + ' total dicoms') +
+        card_info_field(annotated_ef_gls_frame + ' ef and gls / ' + total_frame + ' frames', 'far fa-images',
+            annotated_ef_gls_frame + ' annotated ef and gls frames in ' + total_frame + ' total dicoms') +
+        card_dropdown_field(get_doctor_name(doctors.map(pair => pair[0])),
+            doctors.map(pair => pair[0] + ': ' + pair[1] + ' times'), 'fas fa-fw fa-user-md', '#388e3c') +
+        card_info_field(row.Label, 'fas fa-fw fa-tag', '') +
+        card_info_field(row.LastEdit, 'fas fa-fw fa-history', 'Last annotated: ' + to_text(row.LastEdit)) +
+        '</div></div>';
+}
+
+function get_dicom_image_card(row, case_id) {
+    const total_frame = to_text(row.NumTotalFrame);
+    return `<div class="card columns case-image-card" style="background-color: ${get_card_color(row.IsDone)}">` +
+        get_dicom_card_header(row, case_id) +
+        '<div class="card-body case-info-card-body">' +
+        card_image_field(row.FullImagePath) +
+        card_info_field(total_frame + ' frames', 'far fa-images', 'dicom has ' + total_frame + ' frames') +
+        '<input placeholder="Doctor comment" type="text" class="form-control">' +
+        '</div></div>';
+}
+
+// Set the value of a hidden dcc.Input and fire the event React listens to,
+// so its server callbacks run as if the value had been typed.
+function send_to_dash(input_id, value) {
+    const input = document.getElementById(input_id);
+    if (!input || input.value === value) {
+        return;
+    }
+    // React ignores a value assigned through the element's own setter
+    Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set.call(input, value);
+    input.dispatchEvent(new Event('input', {bubbles: true}));
+}
+
+function render_case_grid(container, rows) {
+    container.innerHTML = card_grid(rows, 4, get_patient_case_card);
+}
+
+function render_dicom_grid(container, case_id, rows, hide_text_data) {
+    const get_card = hide_text_data ? get_dicom_image_card : get_dicom_card;
+    container.innerHTML = card_grid(rows, hide_text_data ? 3 : 4, row => get_card(row, case_id));
+    // the new cards are unticked
+    send_to_dash('screen1-selected-dicoms', '[]');
+}
+
+document.addEventListener('click', function (event) {
+    const link = event.target.closest && event.target.closest('.screen1-open-dicom');
+    if (link) {
+        // the time makes a second click on the same card a new value
+        send_to_dash('screen1-open-dicom', JSON.stringify({
+            case_id: link.dataset.caseId, dicom_id: link.dataset.dicomId, time: Date.now(),
+        }));
+    }
+});
+
+document.addEventListener('change', function (event) {
+    if (!event.target.closest || !event.target.closest('.screen1-dicom-select')) {
+        return;
+    }
+    const grid = event.target.closest('.dicom-grid') || document;
+    const checked = grid.querySelectorAll('.screen1-dicom-select input:checked');
+    send_to_dash('screen1-selected-dicoms', JSON.stringify(Array.from(checked, input => input.value)));
+});
+
+window.dash_clientside.card_grid = {
+
+    render_cases: function (rows) {
+        const container = document.getElementById('patient-case-grid');
+        if (!rows || !container) {
+            throw window.dash_clientside.PreventUpdate;
+        }
+        render_case_grid(container, rows);
+        return '';
+    },
+
+    render_dicoms: function (page) {
+        const container = document.getElementById('screen1-dicom_grid');
+        if (!page || !container) {
+            throw window.dash_clientside.PreventUpdate;
+        }
+        render_dicom_grid(container, page.case_id, page.rows, page.hide_text_data);
+        return '';
+    },
+};
@@ -0,0 +1,109 @@
+if(!window.dash_clientside) {window.dash_clientside = {};}
+
+// Screen 1 for small cases: DicomController.get_case_columns sends the
+// DICOMs of a case once, and these callbacks filter, sort, page and build
+// the cards with the templates of card_grid.js like views/screen_1.py.
+
+function select_positions(case_columns, doctors, sort_field, ascending, filter_option) {
+    const doctor_lists = case_columns.columns.DoctorList;
+    const flags = case_columns.flags[filter_option];
+    const positions = [];
+    for (let i = 0; i < doctor_lists.length; i++) {
+        if (flags && !flags[i]) {
+            continue;
+        }
+        // a record must hold every selected doctor
+        if (!doctors.every(doctor => doctor_lists[i].some(pair => pair[0] === doctor))) {
+            continue;
+        }
+        positions.push(i);
+    }
+    const ranks = sort_field ? case_columns.ranks[sort_field] : null;
+    if (ranks) {
+        // SortIndex order: missing values last in both directions, ties stable
+        const missing_rank = ranks.reduce((a, b) => Math.max(a, b), -1) + 1;
+        const key = i => ranks[i] < 0 ? missing_rank : (ascending ? ranks[i] : missing_rank - 1 - ranks[i]);
+        positions.sort((a, b) => key(a) - key(b));
+    }
+    return positions;
+}
+
+function get_page_rows(case_columns, positions) {
+    const columns = case_columns.columns;
+    return positions.map(i => {
+        const row = {};
+        for (const field in columns) {
+            row[field] = columns[field][i];
+        }
+        return row;
+    });
+}
+
+function get_triggered_ids() {
+    return window.dash_clientside.callback_context.triggered.map(trigger => trigger.prop_id.split('.')[0]);
+}
+
+window.dash_clientside.screen_1 = {
+
+    select_dicoms: function (selected_doctors, sort_field, sort_mode, filter_options, case_columns) {
+        if (!case_columns) {
+            throw window.dash_clientside.PreventUpdate;
+        }
+        const positions = select_positions(case_columns, selected_doctors || [], sort_field,
+            Array.isArray(sort_mode) && sort_mode.length === 1, filter_options);
+        // new columns after a review keep the page the reviewer is on
+        const triggered = get_triggered_ids();
+        const refresh = triggered.length > 0 && triggered.every(id => id === 'screen1-case-columns');
+        return [{positions: positions, refresh: refresh}, 'Total case: ' + positions.length];
+    },
+
+    update_num_page: function (selection, case_columns, current_num_page) {
+        if (!selection) {
+            throw window.dash_clientside.PreventUpdate;
+        }
+        const num_page = String(Math.floor(selection.positions.length / case_columns.page_size) + 1);
+        if (selection.refresh && num_page === current_num_page) {
+            return window.dash_clientside.no_update;
+        }
+        return num_page;
+    },
+
+    on_next_prev_page: function (first, next, prev, last, max_page, current_page_index) {
+        if (max_page === null || max_page === undefined) {
+            return current_page_index;
+        }
+        max_page = parseInt(max_page);
+        if (current_page_index !== null && current_page_index !== undefined) {
+            current_page_index = parseInt(current_page_index);
+        }
+        const triggered = get_triggered_ids();
+        const button_id = triggered.length ? triggered[0] : 'None';
+        if (button_id === 'screen1-client-next-page-button') {
+            current_page_index = (current_page_index % max_page + max_page) % max_page + 1;
+        } else if (button_id === 'screen1-client-prev-page-button') {
+            current_page_index = current_page_index - 1;
+            current_page_index = current_page_index < 1 ? max_page + current_page_index : current_page_index;
+        } else if (button_id === 'screen1-client-first-page-button') {
+            current_page_index = 1;
+        } else if (button_id === 'screen1-client-last-page-button') {
+            current_page_index = max_page;
+        } else if (button_id === 'screen1-client-num-page') {
+            current_page_index = 1;
+        }
+        return current_page_index;
+    },
+
+    render_page: function (page, selection, hide_text_data, case_columns) {
+        const container = document.getElementById('screen1-client-dicom_grid');
+        if (!case_columns || !selection || !container) {
+            throw window.dash_clientside.PreventUpdate;
+        }
+        page = page === null || page === undefined || page === '' ? 0 : parseInt(page);
+        page = (isNaN(page) ? 0 : page) - 1;
+        const size = case_columns.page_size;
+        // slice like python: page 0 (-1 here) selects nothing
+        const positions = selection.positions.slice(page * size, (page + 1) * size);
+        render_dicom_grid(container, case_columns.case_id, get_page_rows(case_columns, positions), hide_text_data);
+        return '';
+    },
+};
@@ -1,65 +1,247 @@
 if(!window.dash_clientside) {window.dash_clientside = {};}
 
-function draw_line(ef_boundary, color, canvas, context) {
+function decode_array(data, ArrayType) {
+    const bytes = Uint8Array.from(atob(data), c => c.charCodeAt(0));
+    return new ArrayType(bytes.buffer);
+}
+
+function unpack_annotation(payload) {
+    // see controllers/annotation_codec.py: PackedAnnotation.to_payload
+    let shapes = {};
+    for (const kind in payload.shapes) {
+        const arrays = payload.shapes[kind];
+        shapes[kind] = {
+            coords: decode_array(arrays.coords, Float32Array),
+            lines: decode_array(arrays.lines, Int32Array),
+            frames: decode_array(arrays.frames, Int32Array),
+        };
+    }
+    return {num_frames: payload.num_frames, shapes: shapes};
+}
+
+function num_lines(shapes, frame_idx) {
+    return shapes.frames[frame_idx + 1] - shapes.frames[frame_idx];
+}
+
+function draw_line(shapes, frame_idx, color, canvas, context) {
     let height = canvas.height;
     let width = canvas.width;
-    let line;
+    const coords = shapes.coords;
     context.lineWidth = 2;
-    if (ef_boundary) {
-        for (let line_idx = 0; line_idx < ef_boundary.length; line_idx++) {
-            line = ef_boundary[line_idx];
-            for (let i = 0; i < line.length - 1; i++) {
-                context.beginPath();
-                context.moveTo(line[i].x * width, line[i].y * height);
-                context.lineTo(line[i + 1].x * width, line[i + 1].y * height);
-                context.strokeStyle = color;
-                context.stroke();
-            }
+    context.strokeStyle = color;
+    for (let line_idx = shapes.frames[frame_idx]; line_idx < shapes.frames[frame_idx + 1]; line_idx++) {
+        const start = shapes.lines[line_idx];
+        const end = shapes.lines[line_idx + 1];
+        context.beginPath();
+        context.moveTo(coords[2 * start] * width, coords[2 * start + 1] * height);
+        for (let i = start + 1; i < end; i++) {
+            context.lineTo(coords[2 * i] * width, coords[2 * i + 1] * height);
         }
-    } else {
-        context.clearRect(0, 0, canvas.width, canvas.height);
+        context.stroke();
     }
 }
 
-function draw_point(ef_point, color, canvas, context) {
+function draw_point(shapes, frame_idx, color, canvas, context) {
     let height = canvas.height;
     let width = canvas.width;
+    const coords = shapes.coords;
     const radius = 3; // Arc radius
     const startAngle = 0; // Starting point on circle
     const endAngle = 2 * Math.PI; // End point on circle
     context.font = "18px Arial";
+    context.strokeStyle = color;
+    context.fillStyle = color;
 
-    for (let point_idx = 0; point_idx < ef_point.length; point_idx++) {
-        let x = ef_point[point_idx].x * width; // x coordinate
-        let y = ef_point[point_idx].y * height; // y coordinate
-        context.beginPath();
-        context.strokeStyle = color;
-        context.fillStyle = color;
-        context.fillText((point_idx + 1).toString(), x, y - 10);
-        context.arc(x, y, radius, startAngle, endAngle, true);
-        context.fill();
-        context.stroke();
+    for (let line_idx = shapes.frames[frame_idx]; line_idx < shapes.frames[frame_idx + 1]; line_idx++) {
+        const start = shapes.lines[line_idx];
+        for (let i = start; i < shapes.lines[line_idx + 1]; i++) {
+            let x = coords[2 * i] * width; // x coordinate
+            let y = coords[2 * i + 1] * height; // y coordinate
+            context.beginPath();
+            context.fillText((i - start + 1).toString(), x, y - 10);
+            context.arc(x, y, radius, startAngle, endAngle, true);
+            context.fill();
+            context.stroke();
+        }
     }
+}
 
+function draw_annotation(frame_idx, annotation, canvas, context) {
+    if (frame_idx >= 0 && frame_idx < annotation.num_frames) {
+        const shapes = annotation.shapes;
+        context.clearRect(0, 0, canvas.width, canvas.height);
+        if (num_lines(shapes.ef_boundary, frame_idx) > 0) {
+            draw_line(shapes.ef_boundary, frame_idx, '#00ff00', canvas, context);
+            draw_line(shapes.gls_boundary, frame_idx, '#ff0000', canvas, context);
+            draw_point(shapes.ef_point, frame_idx, '#00ff00', canvas, context);
+            draw_point(shapes.gls_point, frame_idx, '#ff0000', canvas, context);
+        }
+    }
 }
 
-function draw_annotation(frame_idx, json_data, canvas, context) {
-    let dicom_annotations = json_data.dicomAnnotation[frame_idx];
-    if (dicom_annotations) {
-        let ef_boundary = dicom_annotations.ef_boundary;
-        let gls_boundary = dicom_annotations.gls_boundary;
-        let ef_point = dicom_annotations.ef_point;
-        let gls_point = dicom_annotations.gls_point;
+// Annotation windows of ``window_size`` frames fetched from the server on
+// demand; the windows around the shown frame are prefetched.
+const ANNOTATION_PREFETCH_WINDOWS = 2;
+const ANNOTATION_CACHED_WINDOWS = 32;
+
+function AnnotationLoader(header) {
+    this.url = header.url;
+    this.num_frames = header.num_frames;
+    this.window_size = header.window_size;
+    this.windows = new Map();
+    this.pending = new Map();
+    this.current_frame = null;
+    this.windows.set(0, unpack_annotation(header.first_window));
+}
+
+AnnotationLoader.prototype.load = function (window_idx) {
+    if (this.windows.has(window_idx)) {
+        return Promise.resolve(this.windows.get(window_idx));
+    }
+    if (!this.pending.has(window_idx)) {
+        const start = window_idx * this.window_size;
+        const request = fetch(this.url + '?start=' + start + '&count=' + this.window_size)
+            .then(response => response.json())
+            .then(payload => {
+                const annotation = unpack_annotation(payload);
+                this.pending.delete(window_idx);
+                this.windows.set(window_idx, annotation);
+                if (this.windows.size > ANNOTATION_CACHED_WINDOWS) {
+                    this.windows.delete(this.windows.keys().next().value);
+                }
+                return annotation;
+            })
+            .catch(error => {
+                this.pending.delete(window_idx);
+                throw error;
+            });
+        this.pending.set(window_idx, request);
+    }
+    return this.pending.get(window_idx);
+};
+
+AnnotationLoader.prototype.prefetch = function (window_idx) {
+    const num_windows = Math.ceil(this.num_frames / this.window_size);
+    for (let i = window_idx - ANNOTATION_PREFETCH_WINDOWS; i <= window_idx + ANNOTATION_PREFETCH_WINDOWS; i++) {
+        if (i >= 0 && i < num_windows) {
+            this.load(i).catch(() => {});
+        }
+    }
+};
+
+AnnotationLoader.prototype.draw = function (frame_idx, canvas, context) {
+    if (frame_idx < 0 || frame_idx >= this.num_frames) {
+        return;
+    }
+    const window_idx = Math.floor(frame_idx / this.window_size);
+    const frame_in_window = frame_idx - window_idx * this.window_size;
+    this.current_frame = frame_idx;
+    this.prefetch(window_idx);
+    const annotation = this.windows.get(window_idx);
+    if (annotation) {
+        // refresh its position in the LRU order
+        this.windows.delete(window_idx);
+        this.windows.set(window_idx, annotation);
+        draw_annotation(frame_in_window, annotation, canvas, context);
+    } else {
         context.clearRect(0, 0, canvas.width, canvas.height);
-        if (ef_boundary.length > 0) {
-            draw_line(ef_boundary, '#00ff00', canvas, context);
-            draw_line(gls_boundary, '#ff0000', canvas, context);
-            draw_point(ef_point, '#00ff00', canvas, context);
-            draw_point(gls_point, '#ff0000', canvas, context);
+        this.load(window_idx).then(annotation => {
+            if (this.current_frame === frame_idx) {
+                draw_annotation(frame_in_window, annotation, canvas, context);
+            }
+        }).catch(() => {});
+    }
+};
+
+// Frames decoded by the server, shown over the paused video so that stepping
+// lands on the exact frame instead of seeking by a guessed frame rate.
+const FRAME_PREFETCH = 2;
+
+function FrameStepper(source, image, video) {
+    this.url = source.url;
+    this.num_frames = source.num_frames;
+    this.image = image;
+    this.video = video;
+    this.frame = null;
+    this.prefetched = [];
+}
+
+FrameStepper.prototype.src = function (frame_idx) {
+    return this.url + '/' + frame_idx + '.jpg';
+};
+
+FrameStepper.prototype.current = function () {
+    return this.frame === null ? this.video.get() : this.frame;
+};
+
+FrameStepper.prototype.show = function (frame_idx) {
+    frame_idx = Math.max(frame_idx, 0);
+    if (this.num_frames > 0) {
+        frame_idx = Math.min(frame_idx, this.num_frames - 1);
+    }
+    this.frame = frame_idx;
+    this.image.src = this.src(frame_idx);
+    this.image.hidden = false;
+    // the next steps either way come from the browser cache
+    this.prefetched = [];
+    for (let i = 1; i <= FRAME_PREFETCH; i++) {
+        for (const idx of [frame_idx + i, frame_idx - i]) {
+            if (idx >= 0 && (this.num_frames <= 0 || idx < this.num_frames)) {
+                const image = new Image();
+                image.src = this.src(idx);
+                this.prefetched.push(image);
+            }
         }
     }
+    return frame_idx;
+};
+
+FrameStepper.prototype.hide = function () {
+    this.frame = null;
+    this.image.hidden = true;
+};
+
+FrameStepper.prototype.resume = function () {
+    // continue playback from the frame shown
+    if (this.frame !== null) {
+        this.video.seekTo({frame: this.frame});
+    }
+    this.hide();
+};
+
+// Sprite sheet of every ``stride``-th frame, shown as a preview while the
+// mouse moves over the frame slider, so scrubbing needs no video seeks.
+function Filmstrip(url) {
+    this.index = null;
+    fetch(url)
+        .then(response => response.ok ? response.json() : null)
+        .then(index => {
+            this.index = index;
+            if (index) {
+                this.sprite = new Image();
+                this.sprite.src = index.sprite;
+            }
+        })
+        .catch(() => {});
 }
 
+Filmstrip.prototype.show = function (preview, frame_idx, x) {
+    const index = this.index;
+    if (!index) {
+        return;
+    }
+    const tile = Math.min(Math.round(frame_idx / index.stride), index.num_tiles - 1);
+    const column = tile % index.columns;
+    const row = Math.floor(tile / index.columns);
+    preview.style.width = index.tile_width + 'px';
+    preview.style.height = index.tile_height + 'px';
+    preview.style.left = (x - index.tile_width / 2) + 'px';
+    preview.style.backgroundImage = 'url(' + index.sprite + ')';
+    preview.style.backgroundPosition = (-column * index.tile_width) + 'px ' + (-row * index.tile_height) + 'px';
+    preview.textContent = frame_idx + 1;
+    preview.hidden = false;
+};
+
 function parse(str) {
     var args = [].slice.call(arguments, 1),
         i = 0;
@@ -93,7 +275,8 @@ window.dash_clientside.clientside = {
         set_star("annotation",id)
     },
 
-    init_callback_annotation_review: function (json_data, frame_rate) {
+    init_callback_annotation_review: function (annotation_header, frame_rate, frame_source) {
+        const annotation = new AnnotationLoader(annotation_header);
         const currentFrame = $('#idx-indicator');
         let canvas = document.getElementById("annotation-canvas");
         let context = canvas.getContext('2d');
@@ -102,36 +285,58 @@ window.dash_clientside.clientside = {
             frameRate: frame_rate,
             callback: function (frame) {
                 currentFrame.html(frame);
-                draw_annotation(frame,json_data, canvas, context);
+                annotation.draw(frame, canvas, context);
             }
         });
+        const stepper = new FrameStepper(frame_source, document.getElementById("frame-image"), video);
+        const filmstrip = new Filmstrip(frame_source.filmstrip);
+        const preview = document.getElementById("filmstrip-preview");
 
         video.listen('frame');
+        video.video.addEventListener('play', () => stepper.hide());
         window.dash_clientside.clientside.video = video;
-        window.dash_clientside.clientside.json_data = json_data;
+        window.dash_clientside.clientside.annotation = annotation;
+        window.dash_clientside.clientside.stepper = stepper;
+
+        function step(frame_idx) {
+            if (!video.video.paused) {
+                video.video.pause();
+            }
+            const frame = stepper.show(frame_idx);
+            currentFrame.html(frame);
+            annotation.draw(frame, canvas, context);
+        }
+
+        // the slider is rendered after this callback, so listen on the document
+        $(document).off('.filmstrip')
+            .on('mousemove.filmstrip', '#slider-placeholder .rc-slider', function (event) {
+                const handle = this.querySelector('.rc-slider-handle');
+                const min = Number(handle.getAttribute('aria-valuemin'));
+                const max = Number(handle.getAttribute('aria-valuemax'));
+                const rect = this.getBoundingClientRect();
+                const fraction = Math.min(Math.max((event.clientX - rect.left) / rect.width, 0), 1);
+                const value = Math.round(min + fraction * (max - min));
+                const x = event.clientX - preview.parentNode.getBoundingClientRect().left;
+                filmstrip.show(preview, value - 1, x);
+            })
+            .on('mouseleave.filmstrip', '#slider-placeholder .rc-slider', function () {
+                preview.hidden = true;
+            });
 
         $('#play-pause-button').click(function () {
             if (video.video.paused) {
+                stepper.resume();
                 video.video.play();
             } else {
                 video.video.pause();
             }
         });
         $('#next-frame-button').click(function () {
-            video.seekForward(1, function () {
-                let frame = video.get();
-                currentFrame.html(frame);
-                draw_annotation(frame, json_data, canvas, context);
-
-            })
+            step(stepper.current() + 1);
         });
 
         $('#previous-frame-button').click(function () {
-            video.seekBackward(1, function () {
-                let frame = video.get();
-                currentFrame.html(frame);
-                draw_annotation(frame, json_data, canvas, context);
-            })
+            step(stepper.current() - 1);
         });
     },
     select_slider: function (frame_idx ) {
@@ -140,18 +345,14 @@ window.dash_clientside.clientside = {
         let canvas = document.getElementById("annotation-canvas");
         let context = canvas.getContext('2d');
         const video = window.dash_clientside.clientside.video;
-        const json_data = window.dash_clientside.clientside.json_data;
+        const annotation = window.dash_clientside.clientside.annotation;
+        const stepper = window.dash_clientside.clientside.stepper;
         if (!video.video.paused) {
                 video.video.pause();
         }
-        if (frame_idx === 0){
-            video.seekTo({ time: '00:00:00'});
-        }
-        else{
-            video.seekTo({ frame: frame_idx});
-        }
-        currentFrame.html(video.get());
-        draw_annotation(frame_idx, json_data, canvas, context);
+        frame_idx = stepper.show(frame_idx);
+        currentFrame.html(frame_idx);
+        annotation.draw(frame_idx, canvas, context);
         return "";
     },
     fade_in: function (){
@@ -0,0 +1,66 @@
+"""
+Query latency of the screen 0 filter index on synthetic cases.
+
+    python -m benchmark.filter_index_benchmark --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+
+from controllers.filter_index import FilterIndex
+
+DOCTORS = [f'Doctor {i}' for i in range(200)]
+HOSPITALS = [f'Hospital {i}' for i in range(50)]
+
+
+def make_cases(n, seed=0):
+    rnd = random.Random(seed)
+    return [{
+        'ID': f'{i:07d}',
+        'DoctorList': rnd.sample(DOCTORS, rnd.randint(0, 3)),
+        'Hospital': rnd.choice(HOSPITALS),
+        'PatientName': f'Patient^{i % (n // 2 + 1)}',
+        'NumAnnotatedFrame': rnd.choice([0, 0, 0, rnd.randint(1, 100)]),
+    } for i in range(n)]
+
+
+QUERIES = {
+    'case id': dict(filters=[['ID', '0000042']]),
+    'one doctor': dict(filters=[['DoctorList', ['Doctor 1']]]),
+    'doctor + hospital': dict(filters=[['DoctorList', ['Doctor 1']], ['Hospital', ['Hospital 7']]]),
+    'two doctors + annotated': dict(filters=[['DoctorList', ['Doctor 1', 'Doctor 2']]], flag='annotated'),
+    'patient': dict(filters=[['PatientName', ['Patient^17']]]),
+}
+
+
+def time_query(filter_index, repeat, **query):
+    """``(first, best of the rest, count)``; the first run pays the uncached substring scans."""
+    times = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        positions = filter_index.query(**query)
+        times.append(time.perf_counter() - start)
+    return times[0], min(times[1:]), len(positions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='filter index benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        cases = make_cases(n)
+        start = time.perf_counter()
+        filter_index = FilterIndex(cases,
+                                   list_fields=['DoctorList'],
+                                   scalar_fields=['ID', 'Hospital', 'PatientName'],
+                                   flags={'annotated': lambda x: x['NumAnnotatedFrame'] > 0})
+        print(f'{n} cases: index built in {time.perf_counter() - start:.2f}s')
+        for name, query in QUERIES.items():
+            first, best, count = time_query(filter_index, args.repeat, **query)
+            print(f'    {name:<26} first {first * 1000:8.2f} ms  warm {best * 1000:8.2f} ms  ({count} matches)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Download the third-party css/js of the dashboard into a local bundle.
+
+    python bundle_assets.py
+
+Every file is stored under a content-hashed name next to Brotli and gzip
+copies, and ``manifest.json`` maps the asset names of
+``controllers.static_assets.VENDOR_ASSETS`` to them. app.py loads the
+bundle instead of the CDNs once the manifest exists; copy the directory
+to machines without internet access.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+from urllib.parse import urljoin, urlsplit
+
+import brotli
+import requests
+
+from controllers.static_assets import VENDOR_ASSETS, VENDOR_DIR, VENDOR_MANIFEST
+from controllers.utils import write_atomic
+
+# url(...) references of a stylesheet, quoted or not
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+SOURCE_MAP = re.compile(r'/\*# sourceMappingURL=[^*]*\*/')
+# already compressed formats gain nothing from precompression
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.ttf', '.eot')
+
+
+def get_fingerprinted_name(name, data):
+    stem, extension = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+
+class AssetBundler(object):
+    def __init__(self, vendor_dir, timeout=30):
+        self.vendor_dir = vendor_dir
+        self.timeout = timeout
+        self.session = requests.Session()
+        # source url -> fingerprinted file name
+        self.files = {}
+
+    def fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def rewrite_css(self, css, base_url):
+        """Bundle the files a stylesheet points to and point it at the bundled copies."""
+        def replace(match):
+            reference = match.group(2).strip()
+            if reference.startswith(('data:', '#')):
+                return match.group(0)
+            parts = urlsplit(reference)
+            # keep '?#iefix' style suffixes, they only matter to old browsers
+            suffix = reference[len(reference.split('?')[0].split('#')[0]):]
+            source_url = urljoin(base_url, parts._replace(query='', fragment='').geturl())
+            return f'url({self.add(source_url, os.path.basename(parts.path))}{suffix})'
+
+        return CSS_URL.sub(replace, SOURCE_MAP.sub('', css))
+
+    def add(self, url, name):
+        """Store ``url`` in the bundle under a hashed form of ``name``; return the file name."""
+        if url in self.files:
+            return self.files[url]
+        data = self.fetch(url)
+        if name.endswith('.css'):
+            data = self.rewrite_css(data.decode('utf8'), url).encode('utf8')
+        filename = get_fingerprinted_name(name, data)
+        path = os.path.join(self.vendor_dir, filename)
+        if not os.path.exists(path):
+            write_atomic(path, data)
+            if filename.endswith(PRECOMPRESS_EXTENSIONS):
+                for suffix, compressed in (('.br', brotli.compress(data, quality=11)),
+                                           ('.gz', gzip.compress(data, compresslevel=9))):
+                    if len(compressed) < len(data):
+                        write_atomic(path + suffix, compressed)
+        print(f"[bundle] {url} -> {filename} ({len(data)} bytes)")
+        self.files[url] = filename
+        return filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description='bundle the third-party css/js locally')
+    parser.add_argument('--vendor-dir', type=str, default=VENDOR_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.vendor_dir, exist_ok=True)
+    bundler = AssetBundler(args.vendor_dir)
+    assets = {name: bundler.add(url, name) for name, url in VENDOR_ASSETS.items()}
+    manifest = {"assets": assets, "sources": {filename: url for url, filename in bundler.files.items()}}
+    write_atomic(os.path.join(args.vendor_dir, VENDOR_MANIFEST), json.dumps(manifest, indent=2).encode('utf8'))
+
+    # drop files of older bundles
+    keep = set(bundler.files.values())
+    for filename in os.listdir(args.vendor_dir):
+        base = filename[:-3] if filename.endswith(('.br', '.gz')) else filename
+        if filename != VENDOR_MANIFEST and base not in keep:
+            os.remove(os.path.join(args.vendor_dir, filename))
+    print(f"[bundle] {len(keep)} files in {args.vendor_dir}")
+
+
+if __name__ == '__main__':
+    main()
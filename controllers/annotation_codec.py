@@ -0,0 +1,186 @@
+import base64
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from controllers.cache import CACHE_DIR, LRUCache
+from controllers.utils import replace_file
+
+ANNOTATION_CACHE_DIR = os.environ.get('ANNOTATION_CACHE_DIR', os.path.join(CACHE_DIR, 'annotations'))
+ANNOTATION_CACHE_SIZE = int(os.environ.get('ANNOTATION_CACHE_SIZE', 32))
+PACKED_ANNOTATION_VERSION = 1
+
+# Contours are drawn as polylines, points as numbered dots.
+ANNOTATION_KINDS = ('ef_boundary', 'gls_boundary', 'ef_point', 'gls_point')
+POINT_KINDS = ('ef_point', 'gls_point')
+
+
+class PackedShapes(object):
+    """All shapes of one kind over the frames of a video.
+
+    ``coords`` holds the normalized ``x, y`` of every point as float32,
+    ``lines[l]:lines[l + 1]`` are the points of line ``l`` and
+    ``frames[f]:frames[f + 1]`` the lines of frame ``f``. The points of a
+    frame's ``ef_point``/``gls_point`` list form a single line.
+    """
+
+    def __init__(self, coords, lines, frames):
+        self.coords = coords
+        self.lines = lines
+        self.frames = frames
+
+    @classmethod
+    def from_frames(cls, frames_lines):
+        """Pack ``frames_lines[frame] = [[{"x", "y"}, ...], ...]``."""
+        coords = []
+        lines = [0]
+        frames = [0]
+        for frame_lines in frames_lines:
+            for line in frame_lines:
+                coords.extend(value for point in line for value in (point["x"], point["y"]))
+                lines.append(len(coords) // 2)
+            frames.append(len(lines) - 1)
+        return cls(np.asarray(coords, dtype='<f4').reshape(-1, 2),
+                   np.asarray(lines, dtype='<i4'),
+                   np.asarray(frames, dtype='<i4'))
+
+    def get_frame(self, frame_idx):
+        """Point arrays of the lines of one frame."""
+        line_start, line_end = self.frames[frame_idx], self.frames[frame_idx + 1]
+        return [self.coords[self.lines[i]:self.lines[i + 1]] for i in range(line_start, line_end)]
+
+    def get_window(self, start, stop):
+        """Shapes of frames ``start:stop`` with offsets rebased to the window."""
+        line_start, line_end = self.frames[start], self.frames[stop]
+        point_start, point_end = self.lines[line_start], self.lines[line_end]
+        return PackedShapes(self.coords[point_start:point_end],
+                            self.lines[line_start:line_end + 1] - point_start,
+                            self.frames[start:stop + 1] - line_start)
+
+    def get_num_lines(self):
+        """Number of lines per frame."""
+        return np.diff(self.frames)
+
+
+class PackedAnnotation(object):
+    """NumPy form of the ``dicomAnnotation`` list of an annotation json."""
+
+    def __init__(self, num_frames, shapes):
+        self.num_frames = num_frames
+        self.shapes = shapes
+
+    @classmethod
+    def from_json(cls, json_data):
+        frames = json_data.get("dicomAnnotation") or []
+        shapes = {}
+        for kind in ANNOTATION_KINDS:
+            if kind in POINT_KINDS:
+                frames_lines = [[frame[kind]] if frame.get(kind) else [] for frame in frames]
+            else:
+                frames_lines = [frame.get(kind) or [] for frame in frames]
+            shapes[kind] = PackedShapes.from_frames(frames_lines)
+        return cls(len(frames), shapes)
+
+    def get_window(self, start, stop):
+        """Annotation of frames ``start:stop``; frame 0 of the result is frame ``start``."""
+        start = min(max(start, 0), self.num_frames)
+        stop = min(max(stop, start), self.num_frames)
+        return PackedAnnotation(stop - start, {kind: shapes.get_window(start, stop)
+                                               for kind, shapes in self.shapes.items()})
+
+    def get_summary(self):
+        """Frame counts, the 1-based indices of the frames with an EF contour and the
+        normalized ``[x_min, y_min, x_max, y_max]`` bounding box of all shapes."""
+        has_ef = self.shapes['ef_boundary'].get_num_lines() > 0
+        has_gls = self.shapes['gls_boundary'].get_num_lines() > 0
+        coords = np.concatenate([shapes.coords for shapes in self.shapes.values()])
+        bbox = None
+        if len(coords):
+            bbox = [*coords.min(axis=0).tolist(), *coords.max(axis=0).tolist()]
+        return {
+            "num_frames": self.num_frames,
+            "annotated_index": (np.flatnonzero(has_ef) + 1).tolist(),
+            "num_ef_frames": int(has_ef.sum()),
+            "num_gls_frames": int(has_gls.sum()),
+            "num_ef_and_gls_frames": int((has_ef & has_gls).sum()),
+            "bbox": bbox,
+        }
+
+    def to_payload(self):
+        """JSON-safe dict for a dcc.Store; arrays are base64 little-endian buffers."""
+        def encode(array):
+            return base64.b64encode(array.tobytes()).decode('ascii')
+
+        return {
+            "version": PACKED_ANNOTATION_VERSION,
+            "num_frames": self.num_frames,
+            "shapes": {kind: {"coords": encode(shapes.coords),
+                              "lines": encode(shapes.lines),
+                              "frames": encode(shapes.frames)}
+                       for kind, shapes in self.shapes.items()},
+        }
+
+    @classmethod
+    def from_payload(cls, payload):
+        def decode(data, dtype):
+            return np.frombuffer(base64.b64decode(data), dtype=dtype)
+
+        shapes = {kind: PackedShapes(decode(arrays["coords"], '<f4').reshape(-1, 2),
+                                     decode(arrays["lines"], '<i4'),
+                                     decode(arrays["frames"], '<i4'))
+                  for kind, arrays in payload["shapes"].items()}
+        return cls(payload["num_frames"], shapes)
+
+    def save(self, path):
+        arrays = {}
+        for kind, shapes in self.shapes.items():
+            arrays[f'{kind}.coords'] = shapes.coords
+            arrays[f'{kind}.lines'] = shapes.lines
+            arrays[f'{kind}.frames'] = shapes.frames
+        with open(path, 'wb') as f:
+            np.savez(f, num_frames=np.int32(self.num_frames), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            shapes = {kind: PackedShapes(arrays[f'{kind}.coords'], arrays[f'{kind}.lines'], arrays[f'{kind}.frames'])
+                      for kind in ANNOTATION_KINDS}
+            return cls(int(arrays['num_frames']), shapes)
+
+
+class PackedAnnotationCache(object):
+    """Packed annotations by json path, kept in memory and as ``.npz`` on disk.
+
+    Both levels are keyed by the json mtime, so an edited annotation is
+    converted again on its next read.
+    """
+
+    def __init__(self, cache_dir=ANNOTATION_CACHE_DIR, maxsize=ANNOTATION_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.memory = LRUCache(maxsize=maxsize)
+
+    def get_cache_path(self, json_path, mtime):
+        digest = hashlib.sha1(os.path.abspath(json_path).encode('utf8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}.{mtime}.v{PACKED_ANNOTATION_VERSION}.npz')
+
+    def get(self, json_path):
+        mtime = os.stat(json_path).st_mtime_ns
+        key = (json_path, mtime)
+        packed = self.memory.get(key)
+        if packed is not None:
+            return packed
+        cache_path = self.get_cache_path(json_path, mtime)
+        try:
+            packed = PackedAnnotation.load(cache_path)
+        except (FileNotFoundError, KeyError, ValueError):
+            with open(json_path, 'r') as f:
+                packed = PackedAnnotation.from_json(json.load(f))
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # drop the conversions of older versions of the json
+            prefix = os.path.join(os.path.dirname(cache_path), os.path.basename(cache_path).split('.', 1)[0])
+            replace_file(cache_path, packed.save, stale_pattern=glob.escape(prefix) + '.*.npz')
+        self.memory.set(key, packed)
+        return packed
@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+import time
+
+from controllers.annotation_codec import PackedAnnotation
+from controllers.cache import CACHE_DIR, SQLiteStore
+
+ANNOTATION_JSON_PATH = os.environ["ANNOTATION_JSON_PATH"]
+ANNOTATION_INDEX_REFRESH_INTERVAL = float(os.environ.get('ANNOTATION_INDEX_REFRESH_INTERVAL', 5))
+ANNOTATION_SUMMARY_DB = os.environ.get('ANNOTATION_SUMMARY_DB', os.path.join(CACHE_DIR, 'annotation_summary.sqlite'))
+
+
+class AnnotationSummaryStore(SQLiteStore):
+    """``checked`` and ``PackedAnnotation.get_summary()`` per annotation file version."""
+
+    schema = """CREATE TABLE IF NOT EXISTS annotation_summary (
+                    path TEXT PRIMARY KEY, mtime_ns INTEGER, checked TEXT, summary TEXT)"""
+
+    def __init__(self, db_path=ANNOTATION_SUMMARY_DB):
+        super().__init__(db_path)
+
+    def lookup(self, path, mtime):
+        """``(checked, summary)`` stored for this version of ``path``, or None."""
+        row = self.fetchone("SELECT checked, summary FROM annotation_summary WHERE path = ? AND mtime_ns = ?",
+                            (path, mtime))
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, path, mtime, checked, summary):
+        self.execute("INSERT OR REPLACE INTO annotation_summary VALUES (?, ?, ?, ?)",
+                     (path, mtime, checked, json.dumps(summary)))
+
+
+class AnnotationHistoryEntry(object):
+    """One annotation json: ``<root>/<reviewer>/...<study>____<image>____<timestamp>.json``.
+
+    ``summary`` holds the frame counts of ``PackedAnnotation.get_summary``.
+    """
+
+    def __init__(self, path, reviewer, timestamp, summaries=None):
+        self.path = path
+        self.reviewer = reviewer
+        self.timestamp = timestamp
+        self.summaries = summaries
+        self.mtime = None
+        self.checked = None
+        self.summary = None
+
+    def load(self):
+        """Re-read the fields kept from the json if the file changed since the last read.
+
+        The json is only parsed when ``summaries`` has nothing for its
+        current version, so each version is summarized once for all workers.
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self.mtime:
+            cached = None if self.summaries is None else self.summaries.lookup(self.path, mtime)
+            if cached is None:
+                with open(self.path, 'r') as f:
+                    data_json = json.load(f)
+                checked = data_json.get("checked", "not_check")
+                summary = PackedAnnotation.from_json(data_json).get_summary()
+                if self.summaries is not None:
+                    self.summaries.put(self.path, mtime, checked, summary)
+            else:
+                checked, summary = cached
+            self.checked = checked
+            self.summary = summary
+            self.mtime = mtime
+        return self
+
+
+def get_frame_counts(summary):
+    """The screen 1 frame count fields of a summary; a frame is annotated if it has any contour."""
+    return {
+        "NumAnnotatedFrame": summary["num_ef_frames"] + summary["num_gls_frames"] - summary["num_ef_and_gls_frames"],
+        "NumAnnotatedEFFrame": summary["num_ef_frames"],
+        "NumAnnotatedGLSFrame": summary["num_gls_frames"],
+        "NumAnnotatedEFAndGLSFrame": summary["num_ef_and_gls_frames"],
+    }
+
+
+def parse_annotation_file_name(file_name):
+    """Return ``(study_instance_uid, image_path, timestamp)`` or None for other files."""
+    if not file_name.endswith('.json'):
+        return None
+    parts = file_name[:-len('.json')].split('____')
+    if len(parts) < 3:
+        return None
+    return parts[-3], parts[-2], parts[-1]
+
+
+class AnnotationHistoryIndex(object):
+    """Index from (StudyInstanceUID, ImagePath) to the annotation files of that DICOM.
+
+    Reviewer directories are listed again only when their mtime changes, so
+    a refresh costs one stat per directory and picks up files that landed
+    since the previous one. The ``checked`` field and the frame summary of
+    a new file are read by the refresh that finds it (from the summary
+    store when a worker or ``prescan.py`` already did), not by the screen 1
+    or 2 request. ``version`` changes whenever files are added or removed.
+    """
+
+    def __init__(self, root=ANNOTATION_JSON_PATH, refresh_interval=ANNOTATION_INDEX_REFRESH_INTERVAL,
+                 summaries=None):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self.summaries = summaries if summaries is not None else AnnotationSummaryStore()
+        self._dirs = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_refresh = None
+        self.version = 0
+
+    def _add_file(self, directory, file_name):
+        parsed = parse_annotation_file_name(file_name)
+        if parsed is None:
+            return
+        study_instance_uid, image_path, timestamp = parsed
+        path = os.path.join(directory, file_name)
+        entry = AnnotationHistoryEntry(path, os.path.basename(directory), timestamp, self.summaries)
+        try:
+            entry.load()
+        except (OSError, ValueError) as e:
+            # e.g. a file still being written; get_latest_summary tries again
+            print(f"[annotation] cannot read {path}: {e}")
+        # Copy on write so readers never iterate a dict being modified.
+        key = (study_instance_uid, image_path)
+        entries = dict(self._entries.get(key, {}))
+        entries[path] = entry
+        self._entries[key] = entries
+        self.version += 1
+
+    def _remove_file(self, directory, file_name):
+        parsed = parse_annotation_file_name(file_name)
+        if parsed is None:
+            return
+        key = parsed[:2]
+        entries = dict(self._entries.get(key, {}))
+        entries.pop(os.path.join(directory, file_name), None)
+        if entries:
+            self._entries[key] = entries
+        else:
+            self._entries.pop(key, None)
+        self.version += 1
+
+    def _scan_dir(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        cached_mtime, cached_files = self._dirs.get(directory, (None, frozenset()))
+        if mtime is not None and mtime == cached_mtime:
+            return
+        files = frozenset()
+        if mtime is not None:
+            files = frozenset(e.name for e in os.scandir(directory) if e.is_file())
+        for file_name in cached_files - files:
+            self._remove_file(directory, file_name)
+        for file_name in files - cached_files:
+            self._add_file(directory, file_name)
+        if mtime is None:
+            self._dirs.pop(directory, None)
+        else:
+            self._dirs[directory] = (mtime, files)
+
+    def refresh(self, blocking=True):
+        """Pick up annotation files added or removed since the last refresh.
+
+        With ``blocking=False`` the call returns at once if another thread is
+        already refreshing.
+        """
+        if not self._lock.acquire(blocking):
+            return
+        try:
+            try:
+                directories = {e.path for e in os.scandir(self.root) if e.is_dir()}
+            except FileNotFoundError:
+                directories = set()
+            for directory in directories | set(self._dirs):
+                self._scan_dir(directory)
+            self._last_refresh = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _refresh_if_stale(self):
+        last_refresh = self._last_refresh
+        if last_refresh is None:
+            self.refresh()
+        elif time.monotonic() - last_refresh > self.refresh_interval:
+            self.refresh(blocking=False)
+
+    def get_entries(self, study_instance_uid, image_path):
+        """Annotation files of one DICOM, newest path first."""
+        self._refresh_if_stale()
+        entries = self._entries.get((study_instance_uid, image_path), {})
+        return [entries[path] for path in sorted(entries, reverse=True)]
+
+    def get_latest_entry(self, study_instance_uid, image_path):
+        """Most recent annotation file of one DICOM by its timestamp, or None."""
+        self._refresh_if_stale()
+        entries = self._entries.get((study_instance_uid, image_path))
+        if not entries:
+            return None
+        return max(entries.values(), key=lambda entry: entry.timestamp)
+
+    def get_version(self):
+        """``version`` after picking up the files that landed since the last refresh."""
+        self._refresh_if_stale()
+        return self.version
+
+    def get_latest_summary(self, study_instance_uid, image_path):
+        """Summary of the latest annotation file of one DICOM, or None.
+
+        The summary is the one read when the refresh found the file, so no
+        file is opened here unless that read failed.
+        """
+        entry = self.get_latest_entry(study_instance_uid, image_path)
+        if entry is None:
+            return None
+        if entry.summary is None:
+            try:
+                entry.load()
+            except (OSError, ValueError) as e:
+                print(f"[annotation] cannot read {entry.path}: {e}")
+        return entry.summary
+
+    def set_checked(self, path, checked):
+        """Show a review just submitted for ``path`` until the file itself changes."""
+        entry = self.get_entry(path)
+        if entry is None:
+            return
+        try:
+            entry.load()
+        except (OSError, ValueError):
+            return
+        entry.checked = checked
+
+    def get_entry(self, path):
+        """Entry of the annotation file at ``path``, or None if it is not indexed."""
+        parsed = parse_annotation_file_name(os.path.basename(path))
+        if parsed is None:
+            return None
+        self._refresh_if_stale()
+        return self._entries.get(parsed[:2], {}).get(path)
+
+
+_history_index = None
+_history_index_lock = threading.Lock()
+
+
+def get_annotation_history_index():
+    """History index of ``ANNOTATION_JSON_PATH`` shared by the screen controllers."""
+    global _history_index
+    with _history_index_lock:
+        if _history_index is None:
+            _history_index = AnnotationHistoryIndex()
+    return _history_index
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+QUERY_CACHE_SIZE = int(os.environ.get('QUERY_CACHE_SIZE', 512))
+QUERY_CACHE_TTL = float(os.environ.get('QUERY_CACHE_TTL', 30 * 60))
+DICOM_TABLE_CACHE_SIZE = int(os.environ.get('DICOM_TABLE_CACHE_SIZE', 64))
+# substring filter results kept per filter index
+FILTER_CONTAINS_CACHE_SIZE = int(os.environ.get('FILTER_CONTAINS_CACHE_SIZE', 256))
+# On-disk caches (video metadata, thumbnails, ...) live under this directory.
+CACHE_DIR = os.environ.get('DASHBOARD_CACHE_DIR',
+                           os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache'))
+
+
+class LRUCache(object):
+    """Thread-safe mapping holding at most ``maxsize`` entries.
+
+    The least recently used entry is dropped first; when ``ttl`` is set an
+    entry also expires that many seconds after it was stored.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key satisfies ``predicate``."""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteStore(object):
+    """Base for small persistent caches shared by all workers through one SQLite file.
+
+    Subclasses set ``schema`` to the statement creating their table.
+    """
+
+    schema = None
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        # sqlite connections must not be shared across fork
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(self.schema)
+            self._pid = os.getpid()
+        return self._connection
+
+    def fetchone(self, sql, parameters=()):
+        with self._lock:
+            return self._connect().execute(sql, parameters).fetchone()
+
+    def fetchall(self, sql, parameters=()):
+        with self._lock:
+            return self._connect().execute(sql, parameters).fetchall()
+
+    def execute(self, sql, parameters=()):
+        """Run one statement in its own transaction and return the cursor."""
+        with self._lock:
+            with self._connect() as connection:
+                return connection.execute(sql, parameters)
@@ -0,0 +1,226 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from controllers.cache import CACHE_DIR
+from controllers.utils import iter_json_array
+
+DASHBOARD_FILE_PATH = os.environ['DASHBOARD_FILE_PATH'].strip()
+DASHBOARD_RELOAD_INTERVAL = float(os.environ.get('DASHBOARD_RELOAD_INTERVAL', 5))
+
+
+class CaseIndex(object):
+    """Read-only view of the dashboard json shared by screen 0, 1 and 2.
+
+    The file is parsed once per process; with gunicorn ``preload_app`` this
+    happens in the master so every worker shares the same pages after fork.
+    Records handed out by the index must not be mutated by callers;
+    ``apply_review`` replaces them instead. ``version`` identifies the file
+    content the index was built from.
+
+    Cases are streamed one at a time: the screen 0 summaries are kept and
+    only the byte span of each case is remembered, so the per-case DICOM
+    lists are parsed on first access. They are read from a private unlinked
+    copy of the json taken at load, so the spans stay valid however the
+    json is changed afterwards; the watcher swaps in a new index for that.
+    """
+
+    def __init__(self, json_path):
+        self.json_path = json_path
+        self.cases = []
+        self._case_by_id = {}
+        self._spans = {}
+        # case id -> (dicoms, dicoms by file name), both built from the same list
+        self._dicoms = {}
+        self._load_lock = threading.Lock()
+        self._case_positions = {}
+        self._review_lock = threading.Lock()
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Deleted on close; forked workers share it through the inherited descriptor.
+        self._snapshot = tempfile.TemporaryFile(prefix='case_index.', dir=CACHE_DIR)
+        self._fd = self._snapshot.fileno()
+        try:
+            with open(json_path, 'rb') as source:
+                stat = os.fstat(source.fileno())
+                self.version = (stat.st_mtime_ns, stat.st_size)
+                shutil.copyfileobj(source, self._snapshot, 1 << 20)
+            self._snapshot.flush()
+            self._snapshot.seek(0)
+            with io.open(self._fd, 'r', encoding="utf8", newline='', closefd=False) as f:
+                for case, start, end in iter_json_array(f, 'cases'):
+                    case.pop('Dicom', None)
+                    self._case_positions[case['ID']] = len(self.cases)
+                    self.cases.append(case)
+                    self._case_by_id[case['ID']] = case
+                    self._spans[case['ID']] = (start, end)
+        except Exception:
+            self._snapshot.close()
+            raise
+
+    def __del__(self):
+        snapshot = getattr(self, '_snapshot', None)
+        if snapshot is not None:
+            snapshot.close()
+
+    def _load_dicoms(self, case_id):
+        """``(dicoms, dicoms by file name)`` of a case, parsed on first access."""
+        loaded = self._dicoms.get(case_id)
+        if loaded is not None:
+            return loaded
+        with self._load_lock:
+            loaded = self._dicoms.get(case_id)
+            if loaded is not None:
+                return loaded
+            start, end = self._spans[case_id]
+            case = json.loads(os.pread(self._fd, end - start, start).decode("utf8"))
+            study_instance_uid = case.get('StudyInstanceUID', '')
+            dicoms = case.get('Dicom', [])
+            for dicom in dicoms:
+                dicom['FullImagePath'] = study_instance_uid + '/' + dicom['ImagePath'] + '.jpg'
+            loaded = (dicoms, {dicom['FileName']: dicom for dicom in dicoms})
+            self._dicoms[case_id] = loaded
+        return loaded
+
+    def get_case(self, case_id):
+        return self._case_by_id[case_id]
+
+    def get_case_ids(self):
+        return [case['ID'] for case in self.cases]
+
+    def get_dicoms(self, case_id):
+        return self._load_dicoms(case_id)[0]
+
+    def get_dicom(self, case_id, file_name):
+        return self._load_dicoms(case_id)[1][file_name]
+
+    def apply_review(self, case_id, file_name, checked):
+        """Record a review of one DICOM without reloading the json.
+
+        The DICOM's ``IsDone`` and its case's ``NumApproved``/``NumRejected``/
+        ``LastReview`` are patched by replacing the records at their
+        positions. Return ``(dicom_position, case_position)``, or None if
+        the DICOM already had this state.
+        """
+        with self._review_lock:
+            dicoms, dicom_by_name = self._load_dicoms(case_id)
+            dicom = dicom_by_name[file_name]
+            if dicom.get('IsDone') == checked:
+                return None
+            dicom_position = next(i for i, record in enumerate(dicoms) if record is dicom)
+            reviewed = dict(dicom, IsDone=checked)
+            dicoms[dicom_position] = reviewed
+            dicom_by_name[file_name] = reviewed
+
+            case = self._case_by_id[case_id]
+            case_position = self._case_positions[case_id]
+            reviewed_case = dict(case, LastReview=datetime.now().strftime('%d-%m-%Y'))
+            for field, state in (('NumApproved', 'check_true'), ('NumRejected', 'check_false')):
+                if field in case:
+                    reviewed_case[field] = case[field] + (checked == state) - (dicom.get('IsDone') == state)
+            self.cases[case_position] = reviewed_case
+            self._case_by_id[case_id] = reviewed_case
+        return dicom_position, case_position
+
+
+class CaseIndexWatcher(threading.Thread):
+    """Polls the dashboard json and swaps in a rebuilt index when it changes."""
+
+    def __init__(self, json_path, interval=DASHBOARD_RELOAD_INTERVAL):
+        super(CaseIndexWatcher, self).__init__(name='case-index-watcher', daemon=True)
+        self.json_path = json_path
+        self.interval = interval
+        self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                reload_case_index(self.json_path)
+            except Exception as e:
+                print(f"[CaseIndex] reload of {self.json_path} failed: {e}")
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_watchers = {}
+_review_listeners = []
+
+
+def get_file_version(json_path):
+    stat = os.stat(json_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_case_index(json_path):
+    return CaseIndex(json_path)
+
+
+def reload_case_index(json_path):
+    """Rebuild the index if the file changed; readers keep the old one meanwhile."""
+    current = _indexes.get(json_path)
+    if current is not None and current.version == get_file_version(json_path):
+        return current
+    index = load_case_index(json_path)
+    _indexes[json_path] = index
+    print(f"[CaseIndex] reloaded {json_path} ({len(index.cases)} cases)")
+    return index
+
+
+def _ensure_watcher(json_path):
+    if DASHBOARD_RELOAD_INTERVAL <= 0:
+        return
+    # Threads do not survive fork, so each (pre-forked) worker starts its own.
+    watcher = _watchers.get(json_path)
+    if watcher is not None and watcher.pid == os.getpid():
+        return
+    with _indexes_lock:
+        watcher = _watchers.get(json_path)
+        if watcher is None or watcher.pid != os.getpid():
+            watcher = CaseIndexWatcher(json_path)
+            _watchers[json_path] = watcher
+            watcher.start()
+
+
+def preload_case_index(json_path=DASHBOARD_FILE_PATH):
+    """Load the index without starting the watcher, e.g. in the gunicorn master before fork."""
+    index = _indexes.get(json_path)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(json_path)
+            if index is None:
+                index = load_case_index(json_path)
+                _indexes[json_path] = index
+    return index
+
+
+def get_case_index(json_path=DASHBOARD_FILE_PATH):
+    """Return the current index; never waits on a reload in progress."""
+    index = preload_case_index(json_path)
+    _ensure_watcher(json_path)
+    return index
+
+
+def add_review_listener(listener):
+    """Call ``listener(index, case_id, file_name, dicom_position, case_position)`` after each ``apply_review``."""
+    _review_listeners.append(listener)
+
+
+def apply_review(case_id, file_name, checked, json_path=DASHBOARD_FILE_PATH):
+    """Patch a review into this process's index and let the controllers drop what it affects.
+
+    Other workers only see it once the dashboard json is regenerated.
+    """
+    index = get_case_index(json_path)
+    positions = index.apply_review(case_id, file_name, checked)
+    if positions is None:
+        return
+    for listener in _review_listeners:
+        try:
+            listener(index, case_id, file_name, *positions)
+        except Exception as e:
+            print(f"[CaseIndex] review listener failed: {e}")
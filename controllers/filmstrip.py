@@ -0,0 +1,123 @@
+import glob
+import json
+import math
+import os
+
+import cv2
+import numpy as np
+
+from controllers.cache import CACHE_DIR
+from controllers.thumbnails import ROOT_DICOM_MP4, resize_to_width
+from controllers.utils import write_atomic
+from controllers.video_metadata import VideoMetadataCache
+
+FILMSTRIP_DIR = os.environ.get('FILMSTRIP_DIR', os.path.join(CACHE_DIR, 'filmstrips'))
+FILMSTRIP_TILE_WIDTH = int(os.environ.get('FILMSTRIP_TILE_WIDTH', 160))
+# longer clips keep every k-th frame so the sheet has at most this many tiles
+FILMSTRIP_MAX_TILES = int(os.environ.get('FILMSTRIP_MAX_TILES', 100))
+FILMSTRIP_COLUMNS = int(os.environ.get('FILMSTRIP_COLUMNS', 10))
+FILMSTRIP_QUALITY = int(os.environ.get('FILMSTRIP_QUALITY', 75))
+
+
+class FilmstripCache(object):
+    """Sprite sheets of downscaled frames of the screen 2 videos, cached on disk.
+
+    A sheet is a JPEG grid of every ``stride``-th frame of
+    ``<root>/<directory>/<name>.mp4``, decoded in one pass, with a json
+    index of its layout. Both are named after the video mtime like the
+    thumbnails, so a changed video gets a new sheet on its next request.
+    """
+
+    def __init__(self, root=ROOT_DICOM_MP4, cache_dir=FILMSTRIP_DIR, tile_width=FILMSTRIP_TILE_WIDTH,
+                 max_tiles=FILMSTRIP_MAX_TILES, columns=FILMSTRIP_COLUMNS, video_metadata=None):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.tile_width = tile_width
+        self.max_tiles = max_tiles
+        self.columns = columns
+        self.video_metadata = video_metadata or VideoMetadataCache()
+
+    def get_paths(self, directory, filename, stat):
+        """``(sprite path, index path)`` of the current version of a video."""
+        stem = os.path.splitext(filename)[0]
+        prefix = os.path.join(self.cache_dir, directory, f'{stem}.{self.tile_width}.{stat.st_mtime_ns}')
+        return prefix + '.jpg', prefix + '.json'
+
+    def read_tiles(self, video_path):
+        """Decode the video once; return ``(stride, tiles)`` of every ``stride``-th frame."""
+        frame_count = self.video_metadata.get(video_path)["frame_count"]
+        stride = max(1, math.ceil(frame_count / self.max_tiles))
+        tiles = []
+        video = cv2.VideoCapture(video_path)
+        try:
+            frame_idx = 0
+            while True:
+                if frame_idx % stride:
+                    # skipped frames are decoded but not converted
+                    if not video.grab():
+                        break
+                else:
+                    ret, frame = video.read()
+                    if not ret:
+                        break
+                    tiles.append(resize_to_width(frame, self.tile_width))
+                frame_idx += 1
+        finally:
+            video.release()
+        if len(tiles) > self.max_tiles:
+            # the container reported too few frames
+            step = math.ceil(len(tiles) / self.max_tiles)
+            stride, tiles = stride * step, tiles[::step]
+        return stride, tiles
+
+    def render(self, video_path):
+        """Return ``(sprite as jpg bytes, index)`` of a video, or None if it has no frame."""
+        stride, tiles = self.read_tiles(video_path)
+        if not tiles:
+            return None
+        tile_height, tile_width = tiles[0].shape[:2]
+        columns = min(self.columns, len(tiles))
+        rows = math.ceil(len(tiles) / columns)
+        sheet = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+        for i, tile in enumerate(tiles):
+            row, column = divmod(i, columns)
+            sheet[row * tile_height:(row + 1) * tile_height,
+                  column * tile_width:(column + 1) * tile_width] = tile[:tile_height, :tile_width]
+        ret, data = cv2.imencode('.jpg', sheet, [cv2.IMWRITE_JPEG_QUALITY, FILMSTRIP_QUALITY])
+        if not ret:
+            raise ValueError(f'cannot encode the filmstrip of {video_path}')
+        index = {
+            "stride": stride,
+            "num_tiles": len(tiles),
+            "columns": columns,
+            "tile_width": tile_width,
+            "tile_height": tile_height,
+        }
+        return data.tobytes(), index
+
+    def ensure(self, directory, filename):
+        """Make sure the sheet of a video exists; return ``(sprite path, index)`` or None."""
+        if directory.startswith('.') or filename.startswith('.') or not filename.endswith('.mp4'):
+            return None
+        video_path = os.path.join(self.root, directory, filename)
+        try:
+            stat = os.stat(video_path)
+        except FileNotFoundError:
+            return None
+        sprite_path, index_path = self.get_paths(directory, filename, stat)
+        try:
+            with open(index_path, 'r') as f:
+                return sprite_path, json.load(f)
+        except FileNotFoundError:
+            pass
+        rendered = self.render(video_path)
+        if rendered is None:
+            return None
+        sprite, index = rendered
+        os.makedirs(os.path.dirname(sprite_path), exist_ok=True)
+        # drop sheets of older versions of the video
+        prefix = glob.escape(sprite_path.rsplit('.', 2)[0])
+        # the index goes last, it marks the sheet as complete
+        write_atomic(sprite_path, sprite, stale_pattern=prefix + '.*.jpg')
+        write_atomic(index_path, json.dumps(index).encode('utf8'), stale_pattern=prefix + '.*.json')
+        return sprite_path, index
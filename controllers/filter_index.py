@@ -0,0 +1,93 @@
+import numpy as np
+
+from controllers.cache import FILTER_CONTAINS_CACHE_SIZE, LRUCache
+
+NO_POSITIONS = np.zeros(0, dtype=np.int32)
+
+
+class FilterIndex(object):
+    """Inverted index over a list of records for the dropdown filters.
+
+    Every distinct value of an indexed field maps to the positions of the
+    records holding it, and every filter option in ``flags`` to a boolean
+    mask, so a query is a handful of mask intersections instead of one
+    ``Series.apply`` per selected value.
+
+    ``list_fields`` hold a list (or a dict keyed by value) per record and
+    match by membership. ``scalar_fields`` hold one value per record; a
+    string filter matches it exactly and a list filter matches every value
+    containing the selected one, like the ``value in x`` masks it replaces;
+    the positions of the latest ``contains_cache_size`` such values are cached.
+    """
+
+    def __init__(self, records, list_fields=(), scalar_fields=(), flags=None,
+                 contains_cache_size=FILTER_CONTAINS_CACHE_SIZE):
+        self.size = len(records)
+        self._list_fields = set(list_fields)
+        postings = {field: {} for field in list(list_fields) + list(scalar_fields)}
+        for position, record in enumerate(records):
+            for field in list_fields:
+                for value in record.get(field) or ():
+                    postings[field].setdefault(value, []).append(position)
+            for field in scalar_fields:
+                postings[field].setdefault(record.get(field), []).append(position)
+        self._postings = {
+            field: {value: np.array(positions, dtype=np.int32) for value, positions in values.items()}
+            for field, values in postings.items()
+        }
+        self._flag_predicates = dict(flags or {})
+        self._flags = {
+            name: np.fromiter((bool(predicate(record)) for record in records), dtype=bool, count=self.size)
+            for name, predicate in self._flag_predicates.items()
+        }
+        self._contains = LRUCache(maxsize=contains_cache_size)
+
+    def update_flags(self, position, record):
+        """Recompute the flags of the record now at ``position``.
+
+        Only flags are updated; the indexed fields of the record must not
+        have changed. Masks are replaced, not modified, so concurrent
+        queries see either the old or the new state.
+        """
+        for name, predicate in self._flag_predicates.items():
+            value = bool(predicate(record))
+            if self._flags[name][position] != value:
+                flags = self._flags[name].copy()
+                flags[position] = value
+                self._flags[name] = flags
+
+    def get_flag(self, name):
+        """Boolean mask of the records with filter option ``name``."""
+        return self._flags[name]
+
+    def get_values(self, field):
+        """Distinct values of ``field`` in order of first appearance."""
+        return list(self._postings[field].keys())
+
+    def _positions(self, field, value, exact):
+        postings = self._postings[field]
+        if exact or field in self._list_fields:
+            return postings.get(value, NO_POSITIONS)
+        key = (field, value)
+        positions = self._contains.get(key)
+        if positions is None:
+            matches = [p for k, p in postings.items() if isinstance(k, str) and value in k]
+            positions = np.concatenate(matches) if matches else NO_POSITIONS
+            self._contains.set(key, positions)
+        return positions
+
+    def get_mask(self, filters=None, flag=None):
+        mask = np.ones(self.size, dtype=bool)
+        if flag in self._flags:
+            mask &= self._flags[flag]
+        for field, values in filters or ():
+            exact = isinstance(values, str)
+            for value in ([values] if exact else values):
+                selected = np.zeros(self.size, dtype=bool)
+                selected[self._positions(field, value, exact)] = True
+                mask &= selected
+        return mask
+
+    def query(self, filters=None, flag=None):
+        """Positions of the records matching every filter and the flag, in record order."""
+        return np.flatnonzero(self.get_mask(filters, flag))
@@ -0,0 +1,119 @@
+import os
+import threading
+
+import cv2
+
+from controllers.cache import LRUCache
+
+# open VideoCapture handles and decoded frames kept per process
+FRAME_CAPTURE_CACHE_SIZE = int(os.environ.get('FRAME_CAPTURE_CACHE_SIZE', 8))
+FRAME_CACHE_SIZE = int(os.environ.get('FRAME_CACHE_SIZE', 64))
+# frames decoded before the requested one after a seek, so stepping back hits the cache
+FRAME_READ_BEHIND = int(os.environ.get('FRAME_READ_BEHIND', 4))
+# forward gaps up to this many frames are decoded through instead of seeking
+FRAME_READ_AHEAD = int(os.environ.get('FRAME_READ_AHEAD', 8))
+FRAME_JPEG_QUALITY = int(os.environ.get('FRAME_JPEG_QUALITY', 90))
+
+# format -> (extension, encoder params, mimetype)
+FRAME_FORMATS = {
+    'jpg': ('.jpg', [cv2.IMWRITE_JPEG_QUALITY, FRAME_JPEG_QUALITY], 'image/jpeg'),
+    'png': ('.png', [], 'image/png'),
+}
+
+
+def encode_frame(image, fmt):
+    extension, params, _ = FRAME_FORMATS[fmt]
+    ret, data = cv2.imencode(extension, image, params)
+    if not ret:
+        raise ValueError(f'cannot encode frame as {fmt}')
+    return data.tobytes()
+
+
+class VideoCaptureHandle(object):
+    """An open capture of one version of a video; ``position`` is the next frame ``read`` returns."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.capture = cv2.VideoCapture(path)
+        self.lock = threading.Lock()
+        self.position = 0
+
+    def seek(self, frame_idx):
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        self.position = frame_idx
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if not ret:
+            return None
+        self.position += 1
+        # frames are shared through the cache, callers copy before drawing
+        frame.flags.writeable = False
+        return frame
+
+
+class FrameExtractor(object):
+    """Frame ``N`` of an MP4 by index, with the captures and recent frames cached.
+
+    Each video keeps an open capture that remembers its position, so the
+    next frame is one decode and a short jump forward decodes through the
+    gap; only other jumps seek. Decoded frames are cached by path, mtime and
+    index, so stepping back and forth over recent frames decodes nothing.
+    """
+
+    def __init__(self, capture_cache_size=FRAME_CAPTURE_CACHE_SIZE, frame_cache_size=FRAME_CACHE_SIZE):
+        # evicted captures are released once the last reader drops them
+        self.captures = LRUCache(maxsize=capture_cache_size)
+        self.frames = LRUCache(maxsize=frame_cache_size)
+        self._lock = threading.Lock()
+
+    def get_capture(self, path, version):
+        with self._lock:
+            handle = self.captures.get(path)
+            if handle is None or handle.version != version:
+                handle = VideoCaptureHandle(path, version)
+                self.captures.set(path, handle)
+            return handle
+
+    def get_frame(self, path, frame_idx):
+        """Frame ``frame_idx`` of ``path`` as a read-only BGR array, or None past the end."""
+        version = os.stat(path).st_mtime_ns
+        key = (path, version, frame_idx)
+        frame = self.frames.get(key)
+        if frame is not None:
+            return frame
+        handle = self.get_capture(path, version)
+        with handle.lock:
+            # another request may have decoded it meanwhile
+            frame = self.frames.get(key)
+            if frame is not None:
+                return frame
+            if not handle.position <= frame_idx <= handle.position + FRAME_READ_AHEAD:
+                handle.seek(max(0, frame_idx - FRAME_READ_BEHIND))
+            while handle.position <= frame_idx:
+                position = handle.position
+                frame = handle.read()
+                if frame is None:
+                    return None
+                self.frames.set((path, version, position), frame)
+            return frame
+
+    def iter_frames(self, path, start, stop):
+        """Frames ``start:stop`` of ``path``; stops early at its end."""
+        for frame_idx in range(start, stop):
+            frame = self.get_frame(path, frame_idx)
+            if frame is None:
+                return
+            yield frame
+
+
+_extractor = None
+
+
+def get_frame_extractor():
+    """Frame extractor shared by the screen 2 endpoints of this process."""
+    global _extractor
+    if _extractor is None:
+        _extractor = FrameExtractor()
+    return _extractor
@@ -0,0 +1,156 @@
+import glob
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+from controllers.annotation_codec import POINT_KINDS, PackedAnnotationCache
+from controllers.annotation_index import parse_annotation_file_name
+from controllers.cache import CACHE_DIR
+from controllers.frame_extractor import get_frame_extractor
+from controllers.utils import replace_file
+from controllers.video_metadata import VideoMetadataCache
+
+ROOT_DICOM_MP4 = os.environ["ROOT_DICOM_MP4"]
+OVERLAY_DIR = os.environ.get('OVERLAY_DIR', os.path.join(CACHE_DIR, 'overlays'))
+# frames of one preview clip
+OVERLAY_CLIP_MAX = int(os.environ.get('OVERLAY_CLIP_MAX', 64))
+
+# BGR colors of each kind, the same as the screen 2 canvas
+OVERLAY_COLORS = {
+    'ef_boundary': (0, 255, 0),
+    'gls_boundary': (0, 0, 255),
+    'ef_point': (0, 255, 0),
+    'gls_point': (0, 0, 255),
+}
+OVERLAY_LINE_WIDTH = 2
+OVERLAY_POINT_RADIUS = 3
+OVERLAY_FONT = cv2.FONT_HERSHEY_SIMPLEX
+# mp4 codecs by preference: browsers only play H.264, but OpenCV wheels
+# without an H.264 encoder can only write MPEG-4 part 2
+OVERLAY_FOURCCS = ('avc1', 'mp4v')
+# part of the cache names, bumped when draw_overlay draws differently
+OVERLAY_STYLE = 2
+
+
+def draw_overlay(image, annotation, frame_idx):
+    """Draw the shapes of frame ``frame_idx`` of a ``PackedAnnotation`` onto ``image`` in place."""
+    if frame_idx >= annotation.num_frames:
+        return image
+    # like the screen 2 canvas, only a frame with an EF contour is drawn, GLS included
+    ef_frames = annotation.shapes['ef_boundary'].frames
+    if ef_frames[frame_idx] == ef_frames[frame_idx + 1]:
+        return image
+    height, width = image.shape[:2]
+    scale = np.array([width, height], dtype=np.float32)
+    for kind, shapes in annotation.shapes.items():
+        line_start, line_end = shapes.frames[frame_idx], shapes.frames[frame_idx + 1]
+        if line_start == line_end:
+            continue
+        offsets = shapes.lines[line_start:line_end + 1]
+        # scale every point of the frame at once, then cut it into lines
+        points = np.rint(shapes.coords[offsets[0]:offsets[-1]] * scale).astype(np.int32)
+        lines = [line for line in np.split(points, offsets[1:-1] - offsets[0]) if len(line)]
+        color = OVERLAY_COLORS[kind]
+        if kind not in POINT_KINDS:
+            cv2.polylines(image, lines, False, color, OVERLAY_LINE_WIDTH, cv2.LINE_AA)
+            continue
+        for line in lines:
+            for number, (x, y) in enumerate(line.tolist(), 1):
+                cv2.circle(image, (x, y), OVERLAY_POINT_RADIUS, color, -1, cv2.LINE_AA)
+                cv2.putText(image, str(number), (x, y - 10), OVERLAY_FONT, 0.6, color, 1, cv2.LINE_AA)
+    return image
+
+
+class OverlayRenderer(object):
+    """PNG frames and short MP4 clips of a DICOM video with its annotation drawn in.
+
+    The video is ``<root>/<study>/<image>.mp4`` of the annotation file name.
+    Renders are cached on disk per annotation file and frame range, named
+    after the json and video mtimes, so an edited annotation is drawn again
+    on its next request.
+    """
+
+    def __init__(self, root=ROOT_DICOM_MP4, cache_dir=OVERLAY_DIR, annotations=None, video_metadata=None,
+                 frames=None):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.frames = frames or get_frame_extractor()
+        self.annotations = annotations or PackedAnnotationCache()
+        self.video_metadata = video_metadata or VideoMetadataCache()
+        self.fourcc = None
+
+    def get_video_path(self, json_path):
+        parsed = parse_annotation_file_name(os.path.basename(json_path))
+        if parsed is None:
+            return None
+        study_instance_uid, image_path, _ = parsed
+        path = os.path.join(self.root, study_instance_uid, image_path + '.mp4')
+        return path if os.path.isfile(path) else None
+
+    def get_cache_path(self, json_path, video_path, start, stop, extension):
+        digest = hashlib.sha1(os.path.abspath(json_path).encode('utf8')).hexdigest()
+        version = f'{OVERLAY_STYLE}.{os.stat(json_path).st_mtime_ns}.{os.stat(video_path).st_mtime_ns}'
+        return os.path.join(self.cache_dir, digest[:2], digest, f'{start}-{stop}.{version}{extension}')
+
+    def _render(self, json_path, start, stop, extension, write):
+        """Path of the cached render of frames ``start:stop``, made by ``write`` if missing.
+
+        ``write(tmp_path, annotation, video_path)`` returns False when the
+        video has no frame in the range; the result is then None.
+        """
+        video_path = self.get_video_path(json_path)
+        if video_path is None:
+            return None
+        path = self.get_cache_path(json_path, video_path, start, stop, extension)
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        annotation = self.annotations.get(json_path)
+        # drop renders of older versions of the json or the video
+        prefix = os.path.join(os.path.dirname(path), f'{start}-{stop}.')
+        # the extension picks the encoder / container
+        written = replace_file(path, lambda tmp_path: bool(write(tmp_path, annotation, video_path)),
+                               stale_pattern=glob.escape(prefix) + '*' + extension, tmp_suffix=extension)
+        return path if written else None
+
+    def render_frame(self, json_path, frame_idx):
+        """Path of a PNG of frame ``frame_idx`` with its contours, or None if there is no such frame."""
+        def write(tmp_path, annotation, video_path):
+            image = self.frames.get_frame(video_path, frame_idx)
+            if image is None:
+                return False
+            return cv2.imwrite(tmp_path, draw_overlay(image.copy(), annotation, frame_idx))
+
+        return self._render(json_path, frame_idx, frame_idx + 1, '.png', write)
+
+    def open_writer(self, path, fps, width, height):
+        fourccs = OVERLAY_FOURCCS if self.fourcc is None else (self.fourcc,)
+        for fourcc in fourccs:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+            if writer.isOpened():
+                self.fourcc = fourcc
+                return writer
+            writer.release()
+        raise ValueError(f'no mp4 encoder for {path}')
+
+    def render_clip(self, json_path, start, count):
+        """Path of an MP4 of ``count`` frames from ``start`` with their contours, or None."""
+        stop = start + min(count, OVERLAY_CLIP_MAX)
+
+        def write(tmp_path, annotation, video_path):
+            metadata = self.video_metadata.get(video_path)
+            writer = None
+            try:
+                for frame_idx, image in enumerate(self.frames.iter_frames(video_path, start, stop), start):
+                    if writer is None:
+                        height, width = image.shape[:2]
+                        writer = self.open_writer(tmp_path, metadata["fps"] or 25, width, height)
+                    writer.write(draw_overlay(image.copy(), annotation, frame_idx))
+            finally:
+                if writer is not None:
+                    writer.release()
+            return writer is not None
+
+        return self._render(json_path, start, stop, '.mp4', write)
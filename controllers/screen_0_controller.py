@@ -1,66 +1,108 @@
-import os
+import json
+
+from controllers.cache import LRUCache, QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+from controllers.case_index import DASHBOARD_FILE_PATH, add_review_listener, get_case_index
+from controllers.filter_index import FilterIndex
+from controllers.sort_index import SortIndex
 from controllers.utils import *
 
+# case fields changed by CaseIndex.apply_review
+REVIEW_FIELDS = ('NumApproved', 'NumRejected', 'LastReview')
+# fields the screen 0 cards show; the rest, e.g. the DICOM list, stays on the server
+CARD_FIELDS = ('ID', 'NumApproved', 'NumRejected', 'NumAnnotatedDicom', 'NumTotalDicom', 'NumAnnotatedFrame',
+               'NumTotalFrame', 'DoctorList', 'LastEdit', 'LastReview', 'Hospital', 'PatientName', 'Label', 'IsDone')
+
+
+def get_card_row(record):
+    return {field: record.get(field) for field in CARD_FIELDS}
+
 
 class PatientCaseController:
-    def __init__(self, json_path=os.environ['DASHBOARD_FILE_PATH'].strip()):
-        self.data = get_screen_0_data(json_path)['cases']
-        self.df = pd.DataFrame(self.data)
+    def __init__(self, json_path=DASHBOARD_FILE_PATH):
+        self.json_path = json_path
+        self._prepared = (None, None, None, None)
+        # (session id, query) -> (records, positions) so page flips skip the filtering
+        self.query_cache = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        add_review_listener(self.on_review)
 
-    def get_case_id_list(self):
-        return [i['ID'] for i in self.data]
+    def _prepare(self):
+        # Rebuilt only when the watcher has swapped in a new index.
+        index = get_case_index(self.json_path)
+        prepared_index, fields, filter_index, sort_index = self._prepared
+        if prepared_index is not index:
+            fields = get_record_fields(index.cases)
+            # 'done' is not indexed yet: screen 0 has no IsDone data.
+            filter_index = FilterIndex(index.cases,
+                                       list_fields=['DoctorList'],
+                                       scalar_fields=['ID', 'Hospital', 'PatientName'],
+                                       flags={'annotated': lambda x: x['NumAnnotatedFrame'] > 0})
+            sort_index = SortIndex(index.cases)
+            self._prepared = (index, fields, filter_index, sort_index)
+        return self._prepared
 
-    def set_selected_case(self, selected_case_data):
-        self.selected_case_data = selected_case_data
+    def on_review(self, index, case_id, file_name, dicom_position, case_position):
+        """Refresh the reviewed case in the indexes; only queries sorted by a review field are dropped."""
+        prepared_index, _, filter_index, sort_index = self._prepared
+        if prepared_index is index:
+            filter_index.update_flags(case_position, index.cases[case_position])
+            sort_index.invalidate(REVIEW_FIELDS)
+        self.query_cache.invalidate(lambda key: (json.loads(key[1]).get('sort') or [None])[0] in REVIEW_FIELDS)
 
-    def get_selected_case(self):
-        return self.selected_case_data
+    @property
+    def data(self):
+        return get_case_index(self.json_path).cases
+
+    @property
+    def filter_index(self):
+        return self._prepare()[2]
+
+    def get_case_id_list(self):
+        return [i['ID'] for i in self.data]
 
     def get_num_total_cases(self):
-        return str(len(self.df))
+        return str(len(self.data))
 
     def get_doctor_list(self):
-        doctors = []
-        doctor_list = self.df['DoctorList'].values
-        for i in doctor_list:
-            doctors += i
-        return sorted(list(set(doctors)))
+        return sorted(self.filter_index.get_values('DoctorList'))
 
     def get_hospital_list(self):
-        return self.df['Hospital'].unique()
+        return self.filter_index.get_values('Hospital')
 
     def get_patient_name_list(self):
-        return self.df['PatientName'].unique()
+        return self.filter_index.get_values('PatientName')
 
     def get_data_fields(self):
-        return self.df.keys()
+        return self._prepare()[1]
 
-    def get_patient_case(self, filters=None, sort=None, filter_options=None):
-        dff = self.df
-
-        if filter_options is not None:
-            if filter_options == 'done':
-                ## Chưa implement vì chưa có data isdone màn 1
-                # mask = dff['IsDone'].apply(lambda x: x == 'check_true')
-                # dff = dff[mask]
-                dff = dff
-            elif filter_options == 'annotated':
-                mask = dff['NumAnnotatedFrame'].apply(lambda x: x > 0)
-                dff = dff[mask]
-
-        if filters is not None and len(filters) > 0:
-            for field, values in filters:
-                    if isinstance(values, str):
-                        mask = dff[field].apply(lambda x: values == x)
-                        dff = dff[mask]
-                    else:
-                        for value in values:
-                            mask = dff[field].apply(lambda x: value in x)
-                            dff = dff[mask]
+    def _select(self, filters=None, sort=None, filter_options=None):
+        index, _, filter_index, sort_index = self._prepare()
+        mask = filter_index.get_mask(filters, filter_options)
         if sort is not None:
             field, is_ascending = sort
-            dff = dff.sort_values(field, ascending=is_ascending)
-        return dff.to_dict('records')
+            positions = sort_index.sort(mask, field, is_ascending)
+        else:
+            positions = mask.nonzero()[0]
+        return index.cases, positions
+
+    def get_patient_case(self, filters=None, sort=None, filter_options=None):
+        records, positions = self._select(filters, sort, filter_options)
+        return [records[i] for i in positions]
+
+    def query_patient_case(self, query, page, page_size, session_id=None):
+        """Return ``(total_count, page_records)``, materializing only the requested page.
+
+        ``query`` holds the ``filters``/``sort``/``filter_options`` arguments
+        of ``get_patient_case``; it is small enough to be kept client-side.
+        Results are cached per browser session.
+        """
+        key = (session_id, json.dumps(query, sort_keys=True))
+        cached = self.query_cache.get(key)
+        if cached is not None and cached[0] is self.data:
+            records, positions = cached
+        else:
+            records, positions = self._select(**query)
+            self.query_cache.set(key, (records, positions))
+        return len(positions), [records[i] for i in positions[page * page_size:(page + 1) * page_size]]
 
 
 if __name__ == '__main__':
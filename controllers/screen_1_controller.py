@@ -1,31 +1,164 @@
+import json
 import os
+
+from controllers.annotation_index import ANNOTATION_JSON_PATH, get_annotation_history_index, get_frame_counts
+from controllers.cache import LRUCache, DICOM_TABLE_CACHE_SIZE, QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+from controllers.case_index import DASHBOARD_FILE_PATH, add_review_listener, apply_review, get_case_index
+from controllers.filter_index import FilterIndex
+from controllers.sort_index import SortIndex
+from controllers.verify_client import submit_now
 from controllers.utils import *
-import copy
+
+# cases with at most this many DICOMs are filtered, sorted and paged in the browser; 0 disables
+SCREEN_1_CLIENTSIDE_MAX_DICOMS = int(os.environ.get('SCREEN_1_CLIENTSIDE_MAX_DICOMS', 300))
+# fields the screen 1 cards show
+CARD_FIELDS = ('FileName', 'NumAnnotatedFrame', 'NumTotalFrame', 'NumAnnotatedEFFrame', 'NumAnnotatedGLSFrame',
+               'NumAnnotatedEFAndGLSFrame', 'IsDone', 'LastEdit', 'Label', 'FullImagePath')
+
+
+def get_card_row(record):
+    """The card fields of a DICOM record, with ``DoctorList`` as ``[name, number of edits]`` pairs."""
+    row = {field: record.get(field) for field in CARD_FIELDS}
+    row['DoctorList'] = [[name, len(edits)] for name, edits in (record.get('DoctorList') or {}).items()]
+    return row
+
+
+class DicomTable(object):
+    """DICOM records of one case with their filter and sort indexes."""
+
+    def __init__(self, case_id, dicoms):
+        self.case_id = case_id
+        self.records = dicoms
+        self.fields = get_record_fields(dicoms)
+        self.filter_index = FilterIndex(dicoms,
+                                        list_fields=['DoctorList'],
+                                        flags={'done': lambda x: x['IsDone'] == 'check_true',
+                                               'annotated': lambda x: x['NumAnnotatedFrame'] > 0})
+        self.sort_index = SortIndex(dicoms)
+
+    def select(self, filters=None, sort_field=None, filter_options=None):
+        mask = self.filter_index.get_mask(filters, filter_options)
+        if sort_field is not None:
+            field, is_ascending = sort_field
+            return self.sort_index.sort(mask, field, is_ascending)
+        return mask.nonzero()[0]
 
 
 class DicomController(object):
-    def __init__(self, dicoms_path=os.environ['DASHBOARD_FILE_PATH'].strip()):
-        self.data = get_json(dicoms_path)
+    def __init__(self, dicoms_path=DASHBOARD_FILE_PATH):
+        self.json_path = dicoms_path
         self.hide_text = False
+        # (session id, query) -> (table, positions) so page flips skip the filtering
+        self.query_cache = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        # (case id, data version, annotation version) -> DicomTable so reopening a case skips the indexing
+        self.table_cache = LRUCache(maxsize=DICOM_TABLE_CACHE_SIZE)
+        self.history_index = get_annotation_history_index()
+        add_review_listener(self.on_review)
 
+    @property
+    def index(self):
+        return get_case_index(self.json_path)
 
     def get_dicom_data(self, id):
-        self.id = id
-        self.dicom_data = get_screen1_dicom_data_by_id(self.data, id)['dicoms']
-        self.df = pd.DataFrame(self.dicom_data)
+        """Table of the DICOMs of a case with the counts of their latest annotation files.
+
+        Filters, sort orders and cards all use these counts; a new or
+        removed annotation file makes the next call build a new table.
+        """
+        index = self.index
+        key = (id, index.version, self.history_index.get_version())
+        table = self.table_cache.get(key)
+        if table is None:
+            table = DicomTable(id, self.with_annotation_summary(id, index.get_dicoms(id)))
+            self.table_cache.set(key, table)
+        return table
 
-    def get_num_total_dicoms(self):
-        return str(len(self.df))
+    def get_num_total_dicoms(self, id):
+        return str(len(self.get_dicom_data(id).records))
 
-    def get_data_fields(self):
-        return self.df.keys().drop('DoctorList')
+    def get_data_fields(self, id):
+        return [field for field in self.get_dicom_data(id).fields if field != 'DoctorList']
 
-    def get_doctor_list(self):
-        doctors = []
-        doctor_list = self.df['DoctorList'].values
-        for i in doctor_list:
-            doctors += i
-        return sorted(list(set(doctors)))
+    def on_review(self, index, case_id, file_name, dicom_position, case_position):
+        """Refresh the flags of a reviewed DICOM and drop the cached queries of its case."""
+        table = self.table_cache.get((case_id, index.version, self.history_index.get_version()))
+        if table is not None:
+            reviewed = index.get_dicoms(case_id)[dicom_position]
+            table.records[dicom_position] = self.with_annotation_summary(case_id, [reviewed])[0]
+            table.filter_index.update_flags(dicom_position, table.records[dicom_position])
+            table.sort_index.invalidate(['IsDone'])
+        self.query_cache.invalidate(lambda key: json.loads(key[1]).get('case_id') == case_id)
+
+    def with_annotation_summary(self, id, records):
+        """Copies of ``records`` with the frame counts of their latest annotation file.
+
+        Records without an annotation file keep the counts of the dashboard json.
+        """
+        study_instance_uid = self.index.get_case(id)['StudyInstanceUID']
+        result = []
+        for record in records:
+            summary = self.history_index.get_latest_summary(study_instance_uid, record['ImagePath'])
+            if summary is not None:
+                record = dict(record, **get_frame_counts(summary))
+            result.append(record)
+        return result
+
+    def bulk_review(self, id, dicom_ids, is_accepted, comment):
+        """Accept or reject the latest annotation of several DICOMs in one verify batch.
+
+        Return ``[(dicom_id, status, message)]`` in the order of ``dicom_ids``;
+        ``status`` is ``'sent'``, ``'queued'``, ``'failed'`` or ``'skipped'``
+        for DICOMs without an annotation file.
+        """
+        index = self.index
+        study_instance_uid = index.get_case(id)['StudyInstanceUID']
+        checked = "check_true" if is_accepted else "check_false"
+        results = {}
+        payloads = []
+        for dicom_id in dicom_ids:
+            image_path = index.get_dicom(id, dicom_id)['ImagePath']
+            entry = self.history_index.get_latest_entry(study_instance_uid, image_path)
+            if entry is None:
+                results[dicom_id] = ('skipped', 'no annotation')
+                continue
+            payloads.append((dicom_id, entry, {"relative_path": os.path.relpath(entry.path, ANNOTATION_JSON_PATH),
+                                               "checked": checked,
+                                               "note": comment,
+                                               }))
+        print(f"[API] bulk review of {len(payloads)} dicoms in case {id} is_accepted: {is_accepted}")
+        if payloads:
+            statuses = submit_now([payload for _, _, payload in payloads])
+            for (dicom_id, entry, _), status in zip(payloads, statuses):
+                results[dicom_id] = status
+                if status[0] != 'failed':
+                    self.history_index.set_checked(entry.path, checked)
+                    apply_review(id, dicom_id, checked, self.json_path)
+        return [(dicom_id, *results[dicom_id]) for dicom_id in dicom_ids]
+
+    def is_clientside(self, id):
+        """Whether case ``id`` is small enough for ``get_case_columns``."""
+        return len(self.get_dicom_data(id).records) <= SCREEN_1_CLIENTSIDE_MAX_DICOMS
+
+    def get_case_columns(self, id):
+        """Columnar form of the DICOMs of a case, for querying them in the browser.
+
+        ``columns`` holds the fields of ``get_card_row`` as one list per
+        field. ``ranks`` has the ``SortIndex`` rank of every record per
+        sortable field and ``flags`` the filter options as 0/1, so the
+        browser reproduces ``query_dicom``.
+        """
+        table = self.get_dicom_data(id)
+        rows = [get_card_row(record) for record in table.records]
+        columns = {field: [row[field] for row in rows] for field in (*CARD_FIELDS, 'DoctorList')}
+        return {
+            "case_id": id,
+            "columns": columns,
+            "ranks": {field: table.sort_index.get_ranks(field).tolist() for field in self.get_data_fields(id)},
+            "flags": {name: table.filter_index.get_flag(name).astype(int).tolist() for name in ('done', 'annotated')},
+        }
+
+    def get_doctor_list(self, id):
+        return sorted(self.get_dicom_data(id).filter_index.get_values('DoctorList'))
 
     def get_group_case(self):
         return ['kc', 'vinif', 'bad', 'other', 'not_view']
@@ -39,23 +172,25 @@ class DicomController(object):
     def get_list_properties_case(self):
         return ['2C-3C-4C-PTS_S-PTS_L', '2C-3C-4C', '2C-4C', '2C', '4C', '3C', 'PTS_S', 'PTS_L', 'PW', 'CW', 'TDI_PW', 'CLIP_COLOR']
 
-    def get_dicom(self, filters=None, sort_field=None, filter_options=None):
-        dff = self.df
-        if filter_options is not None:
-            if filter_options == 'done':
-                mask = dff['IsDone'].apply(lambda x: x == 'check_true')
-                dff = dff[mask]
-            elif filter_options == 'annotated':
-                mask = dff['NumAnnotatedFrame'].apply(lambda x: x > 0)
-                dff = dff[mask]
-
-        if filters is not None and len(filters) > 0:
-            for field, values in filters:
-                for value in values:
-                    mask = dff[field].apply(lambda x: value in x)
-                    dff = dff[mask]
+    def get_dicom(self, id, filters=None, sort_field=None, filter_options=None):
+        table = self.get_dicom_data(id)
+        return [table.records[i] for i in table.select(filters, sort_field, filter_options)]
 
-        if sort_field is not None:
-            field, is_ascending = sort_field
-            dff = dff.sort_values(field, ascending=is_ascending, axis=0)
-        return dff.to_dict('records')
+    def query_dicom(self, query, page, page_size, session_id=None):
+        """Return ``(total_count, page_records)`` for the case in ``query['case_id']``.
+
+        The rest of ``query`` holds the ``get_dicom`` arguments. Results are
+        cached per browser session.
+        """
+        key = (session_id, json.dumps(query, sort_keys=True))
+        cached = self.query_cache.get(key)
+        table = self.get_dicom_data(query['case_id'])
+        if cached is not None and cached[0] is table:
+            positions = cached[1]
+        else:
+            query = dict(query)
+            query.pop('case_id')
+            positions = table.select(**query)
+            self.query_cache.set(key, (table, positions))
+        page_records = [table.records[i] for i in positions[page * page_size:(page + 1) * page_size]]
+        return len(positions), page_records
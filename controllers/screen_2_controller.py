@@ -1,97 +1,137 @@
-import glob
-import json
 import os
 from datetime import datetime
 
-import cv2
-import requests
-
-from controllers.utils import get_json
+from controllers.annotation_codec import PackedAnnotationCache
+from controllers.annotation_index import ANNOTATION_JSON_PATH, get_annotation_history_index
+from controllers.case_index import DASHBOARD_FILE_PATH, apply_review, get_case_index
+from controllers.filmstrip import FilmstripCache
+from controllers.frame_extractor import get_frame_extractor
+from controllers.overlay_renderer import OverlayRenderer
+from controllers.verify_client import submit
+from controllers.video_metadata import VideoMetadataCache
 
 ROOT_DICOM_MP4 = os.environ["ROOT_DICOM_MP4"]
-ANNOTATION_JSON_PATH = os.environ["ANNOTATION_JSON_PATH"]
-SERVER_API_VERIFY = os.environ["SERVER_API_VERIFY"]
+# frames per annotation request of screen 2; the first window is sent with the page
+ANNOTATION_WINDOW_SIZE = int(os.environ.get('ANNOTATION_WINDOW_SIZE', 16))
+ANNOTATION_WINDOW_MAX = int(os.environ.get('ANNOTATION_WINDOW_MAX', 128))
 
 
 class DicomVideosController:
-    def __init__(self, json_path=os.environ['DASHBOARD_FILE_PATH'].strip()):
-        self.data = get_json(json_path)
-        self.__dicom_list_to_dict()
-        self.RelativePath = None
+    def __init__(self, json_path=DASHBOARD_FILE_PATH):
+        self.json_path = json_path
+        # built by the first lookup, or by gunicorn's when_ready before the workers fork
+        self.history_index = get_annotation_history_index()
+        self.video_metadata = VideoMetadataCache()
+        self.packed_annotations = PackedAnnotationCache()
+        self.frames = get_frame_extractor()
+        self.overlays = OverlayRenderer(annotations=self.packed_annotations, video_metadata=self.video_metadata,
+                                        frames=self.frames)
+        self.filmstrips = FilmstripCache(video_metadata=self.video_metadata)
         self.annotation_review = None
         self.quality_review = None
-        self.study_instance_uid = None
 
-    def __dicom_list_to_dict(self):
-        for case_id in self.data.keys():
-            dicom_data = self.data[case_id]['Dicom']
-            dicom_data_dict = {}
-            for dicom in dicom_data:
-                dicom_data_dict[dicom['FileName']] = dicom
-            self.data[case_id]['Dicom'] = dicom_data_dict
+    @property
+    def index(self):
+        return get_case_index(self.json_path)
 
     def get_video_path(self, case_id, dicom_id):
-        data_json = self.data[case_id]
-        study_instance_uid = data_json['StudyInstanceUID']
-        dicom_data = data_json["Dicom"][dicom_id]
+        index = self.index
+        study_instance_uid = index.get_case(case_id)['StudyInstanceUID']
+        dicom_data = index.get_dicom(case_id, dicom_id)
         video_path = study_instance_uid + '/' + dicom_data['ImagePath'] + '.mp4'
         return video_path
 
     def get_history_from_dicom_id(self, case_id, dicom_id):
-        self.study_instance_uid = self.data[case_id]['StudyInstanceUID']
-        image_path = self.data[case_id]['Dicom'][dicom_id]["ImagePath"]
-        self.RelativePath = image_path
+        index = self.index
+        study_instance_uid = index.get_case(case_id)['StudyInstanceUID']
+        image_path = index.get_dicom(case_id, dicom_id)["ImagePath"]
 
         history = dict()
-        pattern = f"{self.study_instance_uid}____{image_path}"
-        files = sorted(glob.glob(os.path.join(ANNOTATION_JSON_PATH, "**", f'*{pattern}*')), reverse=True)
-        mp4_file = os.path.join(f"{self.study_instance_uid}/{image_path}" + ".mp4")
-        for f in files:
-            lastFile = f
-            phone_number = os.path.basename(os.path.dirname(lastFile))
-            timeLastFile = lastFile.split("____")[-1][:-5]
-            dtLastFile = datetime.strptime(timeLastFile, "%Y%m%d%H%M%S.%f").strftime("%Y/%m/%d ")
-            data_json = json.load(open(lastFile, 'r'))
-            history[dtLastFile + " " + phone_number] = {"mp4": mp4_file,
-                                                        "checked": data_json.get("checked", "not_check"),
-                                                        "json_path": lastFile
-                                                        }
+        mp4_file = os.path.join(f"{study_instance_uid}/{image_path}" + ".mp4")
+        for entry in self.history_index.get_entries(study_instance_uid, image_path):
+            dtLastFile = datetime.strptime(entry.timestamp, "%Y%m%d%H%M%S.%f").strftime("%Y/%m/%d ")
+            history[dtLastFile + " " + entry.reviewer] = {"mp4": mp4_file,
+                                                          "checked": entry.load().checked,
+                                                          "json_path": entry.path
+                                                          }
         return mp4_file, history
 
-    def get_annotated_index(self, json_data):
-        annotated_frame = []
-        for idx, annotation in enumerate(json_data["dicomAnnotation"]):
-            if len(annotation["ef_boundary"]) > 0:
-                annotated_frame.append(idx + 1)
-        return len(json_data["dicomAnnotation"]), annotated_frame
+    def get_video_file(self, directory, filename):
+        """Path of ``<ROOT_DICOM_MP4>/<directory>/<filename>``, or None if it is not an mp4 there."""
+        if directory.startswith('.') or filename.startswith('.') or not filename.endswith('.mp4'):
+            return None
+        if os.sep in directory or os.sep in filename:
+            return None
+        path = os.path.join(ROOT_DICOM_MP4, directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def get_frame_source(self, video_url):
+        """Store payload for screen 2: where to fetch single decoded frames and the filmstrip of the video."""
+        metadata = self.video_metadata.get(os.path.join(ROOT_DICOM_MP4, video_url))
+        return {"url": '/screen_2/frame/' + video_url, "num_frames": metadata["frame_count"],
+                "filmstrip": '/screen_2/filmstrip/' + video_url}
+
+    def get_annotation_path(self, directory, filename):
+        """Path of ``<ANNOTATION_JSON_PATH>/<directory>/<filename>``, or None if it is not an annotation file."""
+        if directory.startswith('.') or filename.startswith('.') or not filename.endswith('.json'):
+            return None
+        if os.sep in directory or os.sep in filename:
+            return None
+        path = os.path.join(ANNOTATION_JSON_PATH, directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def get_annotation_url(self, json_path):
+        relative_path = os.path.relpath(json_path, ANNOTATION_JSON_PATH)
+        return '/screen_2/annotation/' + relative_path.replace(os.sep, '/')
+
+    def get_annotation_header(self, json_path, window_size=ANNOTATION_WINDOW_SIZE):
+        """Store payload for screen 2: frame counts, the first window of contours and where to fetch the rest."""
+        packed = self.packed_annotations.get(json_path)
+        entry = self.history_index.get_entry(json_path)
+        summary = entry.load().summary if entry is not None else packed.get_summary()
+        return {
+            "url": self.get_annotation_url(json_path),
+            "num_frames": summary["num_frames"],
+            "annotated_index": summary["annotated_index"],
+            "window_size": window_size,
+            "first_window": packed.get_window(0, window_size).to_payload(),
+        }
+
+    def get_annotation_window(self, json_path, start, count):
+        """Packed contours of frames ``start`` .. ``start + count - 1``."""
+        count = min(count, ANNOTATION_WINDOW_MAX)
+        return self.packed_annotations.get(json_path).get_window(start, start + count).to_payload()
+
+    def get_annotated_index(self, annotation_header):
+        return annotation_header["num_frames"], annotation_header["annotated_index"]
 
     def get_frame_rate_and_width_height(self, video_url):
-        video = cv2.VideoCapture(os.path.join(ROOT_DICOM_MP4, video_url))
-
-        # Find OpenCV version
-        (major_ver, minor_ver, subminor_ver) = (cv2.__version__).split('.')
+        metadata = self.video_metadata.get(os.path.join(ROOT_DICOM_MP4, video_url))
+        return metadata["fps"], metadata["height"], metadata["width"]
 
-        if int(major_ver) < 3:
-            fps = video.get(cv2.cv.CV_CAP_PROP_FPS)
-        else:
-            fps = video.get(cv2.CAP_PROP_FPS)
-        ret, frame = video.read()
-        height, width = frame.shape[:2]
-        video.release()
-        return fps, height, width
+    def annotation_submit(self, json_path, is_accepted, comment, case_id=None, dicom_id=None):
+        """Queue the review for the verify server; return False if it could not be queued.
 
-    def annotation_submit(self, json_path, is_accepted, comment):
+        With ``case_id``/``dicom_id`` the review also shows on screen 0 and 1 right away.
+        """
         print(f"[API] {json_path} is_accepted: {is_accepted} reason:{self.annotation_review}")
-        json_path = json_path[len(ANNOTATION_JSON_PATH) + 1:]
-        return_status = requests.post(SERVER_API_VERIFY,
-                                      json={"relative_path": json_path,
-                                            "checked": "check_true" if is_accepted else "check_false",
-                                            "note": comment,
-                                            })
-        return return_status.status_code == 200
-
-    def quality_submit(self, rating, comment):
-        print(f"[API]  {self.RelativePath} rating {rating} comment:{comment}")
+        checked = "check_true" if is_accepted else "check_false"
+        relative_path = json_path[len(ANNOTATION_JSON_PATH) + 1:]
+        try:
+            submit({"relative_path": relative_path,
+                    "checked": checked,
+                    "note": comment,
+                    })
+        except Exception as e:
+            print(f"[API] cannot queue {relative_path}: {e}")
+            return False
+        self.history_index.set_checked(json_path, checked)
+        if case_id is not None and dicom_id is not None:
+            apply_review(case_id, dicom_id, checked, self.json_path)
+        return True
+
+    def quality_submit(self, video_path, rating, comment):
+        print(f"[API]  {video_path} rating {rating} comment:{comment}")
         return True
 
 
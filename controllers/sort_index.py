@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def _dense_ranks(values):
+    """Rank of every value among the distinct values, missing values ranked -1."""
+    ranks = np.full(len(values), -1, dtype=np.int64)
+    present = [i for i, value in enumerate(values) if value is not None]
+    try:
+        present.sort(key=values.__getitem__)
+    except TypeError:
+        # e.g. dict columns such as Label; order them by their text instead
+        present.sort(key=lambda i: str(values[i]))
+    rank = -1
+    previous = object()
+    for i in present:
+        if values[i] != previous:
+            rank += 1
+            previous = values[i]
+        ranks[i] = rank
+    return ranks
+
+
+class SortIndex(object):
+    """Stable sort orders of a list of records, computed once per field and direction.
+
+    Ordering a filtered result is then a pass over the cached permutation
+    instead of a ``sort_values`` on the filtered frame. Missing values are
+    placed last in both directions, like ``sort_values``.
+    """
+
+    def __init__(self, records):
+        self._records = records
+        self._ranks = {}
+        self._orders = {}
+
+    def get_ranks(self, field):
+        """Dense rank of every record by ``field``; -1 where it is missing."""
+        ranks = self._ranks.get(field)
+        if ranks is None:
+            ranks = _dense_ranks([record.get(field) for record in self._records])
+            self._ranks[field] = ranks
+        return ranks
+
+    def get_order(self, field, ascending=True):
+        key = (field, bool(ascending))
+        order = self._orders.get(key)
+        if order is None:
+            ranks = self.get_ranks(field)
+            missing_rank = ranks.max(initial=-1) + 1
+            sort_key = ranks if ascending else missing_rank - 1 - ranks
+            sort_key = np.where(ranks < 0, missing_rank, sort_key)
+            order = np.argsort(sort_key, kind='stable')
+            self._orders[key] = order
+        return order
+
+    def invalidate(self, fields):
+        """Forget the orders of ``fields`` after records were replaced."""
+        for field in fields:
+            self._ranks.pop(field, None)
+            self._orders.pop((field, True), None)
+            self._orders.pop((field, False), None)
+
+    def sort(self, mask, field, ascending=True):
+        """Positions selected by the boolean ``mask``, ordered by ``field``."""
+        order = self.get_order(field, ascending)
+        return order[mask[order]]
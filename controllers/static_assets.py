@@ -0,0 +1,54 @@
+import json
+import mimetypes
+import os
+
+PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VENDOR_DIR = os.environ.get('VENDOR_DIR', os.path.join(PATH, 'vendor'))
+VENDOR_URL_PATH = '/vendor/'
+VENDOR_MANIFEST = 'manifest.json'
+VENDOR_CACHE_TIMEOUT = 365 * 24 * 60 * 60
+
+# Third-party files loaded by the pages, pinned to the versions app.py used
+# from the CDNs. Font Awesome also pulls the webfonts its css points to.
+VENDOR_ASSETS = {
+    'bootstrap.css': 'https://stackpath.bootstrapcdn.com/bootstrap/4.5.0/css/bootstrap.min.css',
+    'font-awesome.css': 'https://use.fontawesome.com/releases/v5.10.2/css/all.css',
+    'jquery.js': 'https://ajax.googleapis.com/ajax/libs/jquery/2.1.1/jquery.min.js',
+}
+
+# Content-Encoding -> suffix of the precompressed copy, best first
+VENDOR_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+for _type, _extension in (('font/woff2', '.woff2'), ('font/woff', '.woff'), ('font/ttf', '.ttf'),
+                          ('application/vnd.ms-fontobject', '.eot'), ('image/svg+xml', '.svg')):
+    mimetypes.add_type(_type, _extension)
+
+
+def load_vendor_manifest(vendor_dir=VENDOR_DIR):
+    """``{asset name: fingerprinted file name}`` written by bundle_assets.py, or None."""
+    try:
+        with open(os.path.join(vendor_dir, VENDOR_MANIFEST), 'r') as f:
+            return json.load(f)["assets"]
+    except FileNotFoundError:
+        return None
+
+
+def get_vendor_url(manifest, name):
+    return VENDOR_URL_PATH + manifest[name]
+
+
+def get_vendor_file(filename, accept_encoding, vendor_dir=VENDOR_DIR):
+    """Return ``(path, content encoding or None)`` of the best copy of ``filename``, or None.
+
+    ``accept_encoding`` is ``request.accept_encodings``; a precompressed
+    copy is only picked if the client accepts its encoding.
+    """
+    if filename.startswith('.') or filename == VENDOR_MANIFEST or os.sep in filename:
+        return None
+    path = os.path.join(vendor_dir, filename)
+    if not os.path.isfile(path):
+        return None
+    for encoding, suffix in VENDOR_ENCODINGS:
+        if accept_encoding[encoding] and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
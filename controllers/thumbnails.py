@@ -0,0 +1,105 @@
+import glob
+import os
+
+import cv2
+
+from controllers.cache import CACHE_DIR
+from controllers.utils import write_atomic
+
+ROOT_DICOM_MP4 = os.environ["ROOT_DICOM_MP4"]
+THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR', os.path.join(CACHE_DIR, 'thumbnails'))
+THUMBNAIL_WIDTH = int(os.environ.get('THUMBNAIL_WIDTH', 320))
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', 80))
+
+# format -> (extension, encoder quality flag, mimetype)
+THUMBNAIL_FORMATS = {
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+}
+
+
+def read_first_frame(video_path):
+    video = cv2.VideoCapture(video_path)
+    try:
+        ret, frame = video.read()
+    finally:
+        video.release()
+    return frame if ret else None
+
+
+def resize_to_width(image, width):
+    height, source_width = image.shape[:2]
+    if source_width <= width:
+        return image
+    return cv2.resize(image, (width, max(1, round(height * width / source_width))), interpolation=cv2.INTER_AREA)
+
+
+class ThumbnailCache(object):
+    """Card-sized WebP/JPEG variants of the screen 1 images, cached on disk.
+
+    The source is ``<root>/<directory>/<name>.jpg``, or the first frame of
+    ``<name>.mp4`` when the jpg is missing. Variants are named after the
+    source mtime, so a changed source gets a new variant on its next request.
+    """
+
+    def __init__(self, root=ROOT_DICOM_MP4, cache_dir=THUMBNAIL_DIR, width=THUMBNAIL_WIDTH):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.width = width
+
+    def get_source(self, directory, filename):
+        """Return ``(path, stat)`` of the image or video a thumbnail is made from, or None."""
+        if directory.startswith('.') or filename.startswith('.'):
+            return None
+        stem = os.path.splitext(filename)[0]
+        for candidate in (filename, stem + '.mp4'):
+            path = os.path.join(self.root, directory, candidate)
+            try:
+                return path, os.stat(path)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def get_variant_path(self, directory, filename, fmt, stat):
+        stem = os.path.splitext(filename)[0]
+        extension = THUMBNAIL_FORMATS[fmt][0]
+        return os.path.join(self.cache_dir, directory, f'{stem}.{self.width}.{stat.st_mtime_ns}{extension}')
+
+    def render(self, source_path):
+        if source_path.endswith('.mp4'):
+            image = read_first_frame(source_path)
+        else:
+            image = cv2.imread(source_path)
+        if image is None:
+            return None
+        return resize_to_width(image, self.width)
+
+    def write(self, variant_path, image, fmt):
+        extension, quality_flag, _ = THUMBNAIL_FORMATS[fmt]
+        ret, data = cv2.imencode(extension, image, [quality_flag, THUMBNAIL_QUALITY])
+        if not ret:
+            raise ValueError(f'cannot encode {variant_path}')
+        os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+        # drop variants of older source versions
+        prefix = variant_path.rsplit('.', 2)[0]
+        write_atomic(variant_path, data.tobytes(), stale_pattern=glob.escape(prefix) + '.*' + extension)
+
+    def ensure(self, directory, filename, formats=('webp',)):
+        """Make sure the variants exist; return ``{format: path}``, empty without a source."""
+        source = self.get_source(directory, filename)
+        if source is None:
+            return {}
+        source_path, stat = source
+        paths = {fmt: self.get_variant_path(directory, filename, fmt, stat) for fmt in formats}
+        missing = [fmt for fmt, path in paths.items() if not os.path.exists(path)]
+        if missing:
+            image = self.render(source_path)
+            if image is None:
+                return {}
+            for fmt in missing:
+                self.write(paths[fmt], image, fmt)
+        return paths
+
+    def get(self, directory, filename, fmt='webp'):
+        """Path of the ``fmt`` variant of ``directory/filename``, or None if there is no source."""
+        return self.ensure(directory, filename, formats=(fmt,)).get(fmt)
@@ -1,5 +1,12 @@
 import pandas as pd
+import glob
 import json
+import os
+import re
+import threading
+
+JSON_CHUNK_SIZE = 1 << 20
+_JSON_SEPARATORS = re.compile(r'[\s,]*')
 
 
 def get_json(data_path):
@@ -59,3 +66,102 @@ def get_screen_0_data(data_path):
         "cases": screen_0_data
     }
     return screen_0_data
+
+
+def replace_file(path, write, stale_pattern=None, tmp_suffix=''):
+    """Create ``path`` through a tmp file and a rename so readers never see a partial file.
+
+    ``write(tmp_path)`` writes the content and may return False to give up;
+    ``replace_file`` then returns False too. After a successful write the
+    files matching the glob ``stale_pattern``, older versions of ``path``,
+    are removed. ``tmp_suffix`` ends the tmp name for writers that pick the
+    format by extension.
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp{tmp_suffix}'
+    try:
+        if write(tmp_path) is False:
+            return False
+        if stale_pattern is not None:
+            for stale in glob.glob(stale_pattern):
+                # keep the tmp files of other writers
+                if stale != path and '.tmp' not in os.path.basename(stale):
+                    try:
+                        os.remove(stale)
+                    except FileNotFoundError:
+                        pass
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
+
+
+def write_atomic(path, data, stale_pattern=None):
+    """``replace_file`` with the bytes ``data``."""
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+    return replace_file(path, write, stale_pattern)
+
+
+def get_record_fields(records):
+    """Union of the keys of ``records`` in order of first appearance."""
+    fields = {}
+    for record in records:
+        for field in record:
+            fields.setdefault(field)
+    return list(fields)
+
+
+def iter_json_array(f, key, chunk_size=JSON_CHUNK_SIZE):
+    """Yield ``(item, start, end)`` for every element of the ``key`` array in ``f``.
+
+    Elements are decoded one at a time so only the current element and one
+    chunk are held in memory. ``start``/``end`` are byte offsets of the
+    element in the file; ``f`` must be opened with ``newline=''``.
+    """
+    decoder = json.JSONDecoder()
+    key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buf = ''
+    byte_pos = 0
+    while True:
+        match = key_pattern.search(buf)
+        if match is not None:
+            break
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise ValueError(f'no "{key}" array found')
+        # keep a tail in case the key is split between two chunks
+        keep = len(buf) - max(len(buf) - len(key) - 64, 0)
+        byte_pos += len(buf[:len(buf) - keep].encode('utf8'))
+        buf = buf[len(buf) - keep:] + chunk
+    byte_pos += len(buf[:match.end()].encode('utf8'))
+    buf = buf[match.end():]
+    pos = 0
+
+    while True:
+        end = _JSON_SEPARATORS.match(buf, pos).end()
+        byte_pos += len(buf[pos:end].encode('utf8'))
+        pos = end
+        if pos == len(buf):
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError(f'unterminated "{key}" array')
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if buf[pos] == ']':
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                break
+            except ValueError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buf, pos = buf[pos:] + chunk, 0
+        start = byte_pos
+        byte_pos += len(buf[pos:end].encode('utf8'))
+        yield item, start, byte_pos
+        pos = end
@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from controllers.cache import CACHE_DIR, SQLiteStore
+
+SERVER_API_VERIFY = os.environ["SERVER_API_VERIFY"]
+# optional endpoint taking {"items": [<verify payload>, ...]} in one request
+SERVER_API_VERIFY_BATCH = os.environ.get('SERVER_API_VERIFY_BATCH', '').strip() or None
+VERIFY_OUTBOX_DB = os.environ.get('VERIFY_OUTBOX_DB', os.path.join(CACHE_DIR, 'verify_outbox.sqlite'))
+VERIFY_CONNECT_TIMEOUT = float(os.environ.get('VERIFY_CONNECT_TIMEOUT', 3.05))
+VERIFY_READ_TIMEOUT = float(os.environ.get('VERIFY_READ_TIMEOUT', 10))
+# retries inside one send, for connection errors and 5xx answers
+VERIFY_RETRIES = int(os.environ.get('VERIFY_RETRIES', 3))
+VERIFY_BACKOFF = float(os.environ.get('VERIFY_BACKOFF', 0.5))
+VERIFY_POOL_SIZE = int(os.environ.get('VERIFY_POOL_SIZE', 8))
+# sends of one outbox entry before it is given up, spaced by a growing delay
+VERIFY_MAX_ATTEMPTS = int(os.environ.get('VERIFY_MAX_ATTEMPTS', 20))
+VERIFY_RETRY_DELAY_MAX = float(os.environ.get('VERIFY_RETRY_DELAY_MAX', 5 * 60))
+VERIFY_DRAIN_INTERVAL = float(os.environ.get('VERIFY_DRAIN_INTERVAL', 2))
+# renewed before each send, so it must outlast one send with all its retries
+VERIFY_CLAIM_LEASE = float(os.environ.get(
+    'VERIFY_CLAIM_LEASE', 2 * (VERIFY_CONNECT_TIMEOUT + VERIFY_READ_TIMEOUT) * (VERIFY_RETRIES + 1)))
+VERIFY_BATCH_SIZE = int(os.environ.get('VERIFY_BATCH_SIZE', 32))
+# seconds submit_now waits for the server; the calls without an answer by then go to the outbox
+VERIFY_SUBMIT_TIMEOUT = float(os.environ.get('VERIFY_SUBMIT_TIMEOUT', 5))
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def is_permanent_error(response):
+    """Whether an answer refuses the call for good, e.g. a 4xx other than 429."""
+    return response is not None and 400 <= response.status_code < 500 and response.status_code not in RETRY_STATUS
+
+
+def make_retry(retries=VERIFY_RETRIES, backoff=VERIFY_BACKOFF):
+    kwargs = dict(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUS, raise_on_status=False)
+    # A verify call sets the checked state of one file, so repeating it is safe.
+    try:
+        return Retry(allowed_methods=frozenset(['POST']), **kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=frozenset(['POST']), **kwargs)
+
+
+class VerifyClient(object):
+    """HTTP client for the verify server with a persistent connection pool."""
+
+    def __init__(self, pool_size=VERIFY_POOL_SIZE, timeout=(VERIFY_CONNECT_TIMEOUT, VERIFY_READ_TIMEOUT),
+                 retry=None):
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=retry if retry is not None else make_retry())
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, url, payload):
+        """POST ``payload`` as json; return ``(response or None, error message or None)``."""
+        try:
+            response = self.session.post(url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            return None, f"{type(e).__name__}: {e}"
+        if response.status_code != 200:
+            return response, f"HTTP {response.status_code}"
+        return response, None
+
+    def post_batch(self, batch_url, payloads):
+        """Send ``payloads`` in one request; return ``(results, error)``.
+
+        ``results`` has one error message (or None) per payload, taken from the
+        ``{"results": [{"ok": ..., "error": ...}, ...]}`` answer. ``results``
+        is None when the server could not be reached, answered with a
+        transient error or sent an answer that cannot be matched to the
+        payloads, e.g. one without per-item results.
+        """
+        response, error = self.post(batch_url, {"items": payloads})
+        if response is None:
+            return None, error
+        if error is not None:
+            if not is_permanent_error(response):
+                return None, error
+            return [error] * len(payloads), error
+        try:
+            items = response.json()["results"]
+        except (ValueError, KeyError, TypeError):
+            return None, "unparseable batch answer"
+        if len(items) != len(payloads):
+            return None, f"{len(items)} results for {len(payloads)} items"
+        return [None if item.get("ok", True) else item.get("error") or "rejected" for item in items], None
+
+
+class VerifyOutbox(SQLiteStore):
+    """Durable queue of verify calls, shared by all workers.
+
+    An entry is ``pending`` until it is ``sent`` or ``failed``: refused by
+    the server or not sent after ``VERIFY_MAX_ATTEMPTS`` tries. Senders
+    claim entries for ``VERIFY_CLAIM_LEASE`` seconds and renew the claim
+    before each send, so a worker that dies mid-send only delays its
+    entries and a slow drain does not lose them to another worker.
+    """
+
+    schema = """CREATE TABLE IF NOT EXISTS verify_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, payload TEXT, status TEXT,
+                    attempts INTEGER, next_attempt REAL, claim TEXT, claim_until REAL,
+                    last_error TEXT, created REAL)"""
+
+    def __init__(self, db_path=VERIFY_OUTBOX_DB, max_attempts=VERIFY_MAX_ATTEMPTS):
+        super().__init__(db_path)
+        self.max_attempts = max_attempts
+
+    def put(self, url, payload):
+        now = time.time()
+        cursor = self.execute("INSERT INTO verify_outbox (url, payload, status, attempts, next_attempt, created) "
+                              "VALUES (?, ?, 'pending', 0, ?, ?)", (url, json.dumps(payload), now, now))
+        return cursor.lastrowid
+
+    def claim(self, limit=VERIFY_BATCH_SIZE, lease=VERIFY_CLAIM_LEASE):
+        """Claim due entries; return ``(claim token, [(id, url, payload, attempts)])``."""
+        token = uuid.uuid4().hex
+        now = time.time()
+        self.execute("UPDATE verify_outbox SET claim = ?, claim_until = ? WHERE id IN ("
+                     "SELECT id FROM verify_outbox WHERE status = 'pending' AND next_attempt <= ? "
+                     "AND (claim_until IS NULL OR claim_until < ?) ORDER BY id LIMIT ?)",
+                     (token, now + lease, now, now, limit))
+        rows = self.fetchall("SELECT id, url, payload, attempts FROM verify_outbox WHERE claim = ? ORDER BY id",
+                             (token,))
+        return token, [(id, url, json.loads(payload), attempts) for id, url, payload, attempts in rows]
+
+    def renew(self, id, token, lease=VERIFY_CLAIM_LEASE):
+        """Extend the claim on an entry; False if the claim was lost and the entry must not be sent."""
+        cursor = self.execute("UPDATE verify_outbox SET claim_until = ? WHERE id = ? AND claim = ? "
+                              "AND status = 'pending'", (time.time() + lease, id, token))
+        return cursor.rowcount == 1
+
+    def mark_sent(self, id):
+        self.execute("UPDATE verify_outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, "
+                     "claim = NULL, claim_until = NULL WHERE id = ?", (id,))
+
+    def mark_error(self, id, attempts, error, permanent=False):
+        """Schedule another send with exponential backoff, or give up after ``max_attempts``.
+
+        A ``permanent`` error, the server refusing the call, fails the entry at once.
+        """
+        attempts += 1
+        status = 'failed' if permanent or attempts >= self.max_attempts else 'pending'
+        delay = min(VERIFY_BACKOFF * 2 ** attempts, VERIFY_RETRY_DELAY_MAX)
+        self.execute("UPDATE verify_outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ?, "
+                     "claim = NULL, claim_until = NULL WHERE id = ?",
+                     (status, attempts, time.time() + delay, error, id))
+
+    def get_status(self, id):
+        """``(status, last_error)`` of an entry, or None if there is no such entry."""
+        return self.fetchone("SELECT status, last_error FROM verify_outbox WHERE id = ?", (id,))
+
+
+class VerifySubmitter(threading.Thread):
+    """Sends the outbox entries in the background; woken at once by ``submit``."""
+
+    def __init__(self, outbox, client, interval=VERIFY_DRAIN_INTERVAL):
+        super(VerifySubmitter, self).__init__(name='verify-submitter', daemon=True)
+        self.outbox = outbox
+        self.client = client
+        self.interval = interval
+        self.wake = threading.Event()
+        self.pid = os.getpid()
+
+    def drain(self):
+        while True:
+            token, entries = self.outbox.claim()
+            if not entries:
+                return
+            for id, url, payload, attempts in entries:
+                if not self.outbox.renew(id, token):
+                    continue
+                response, error = self.client.post(url, payload)
+                if error is None:
+                    self.outbox.mark_sent(id)
+                else:
+                    print(f"[API] verify #{id} failed (attempt {attempts + 1}): {error}")
+                    self.outbox.mark_error(id, attempts, error, permanent=is_permanent_error(response))
+
+    def run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"[API] verify outbox drain failed: {e}")
+
+
+_outbox = None
+# 'background' or 'interactive' -> client
+_clients = {}
+_client_lock = threading.Lock()
+_submitter = None
+_submitter_lock = threading.Lock()
+
+
+def get_verify_outbox():
+    global _outbox
+    if _outbox is None:
+        _outbox = VerifyOutbox()
+    return _outbox
+
+
+def get_verify_client(interactive=False):
+    """This process's client; pooled connections are not shared across fork.
+
+    The ``interactive`` client, for calls a user waits on, has a short
+    timeout and no retries; the outbox retries what it could not send.
+    """
+    kind = 'interactive' if interactive else 'background'
+    client = _clients.get(kind)
+    if client is not None and client.pid == os.getpid():
+        return client
+    with _client_lock:
+        client = _clients.get(kind)
+        if client is None or client.pid != os.getpid():
+            if interactive:
+                client = VerifyClient(timeout=(min(VERIFY_CONNECT_TIMEOUT, VERIFY_SUBMIT_TIMEOUT), VERIFY_SUBMIT_TIMEOUT),
+                                      retry=make_retry(retries=0))
+            else:
+                client = VerifyClient()
+            _clients[kind] = client
+        return client
+
+
+def start_verify_submitter():
+    """Start this process's submitter; threads do not survive fork, so each worker has its own."""
+    global _submitter
+    submitter = _submitter
+    if submitter is not None and submitter.pid == os.getpid():
+        return submitter
+    with _submitter_lock:
+        if _submitter is None or _submitter.pid != os.getpid():
+            _submitter = VerifySubmitter(get_verify_outbox(), get_verify_client())
+            _submitter.start()
+        return _submitter
+
+
+def submit(payload, url=SERVER_API_VERIFY):
+    """Queue a verify call and return its outbox id; the call itself runs in the background."""
+    id = get_verify_outbox().put(url, payload)
+    start_verify_submitter().wake.set()
+    return id
+
+
+def submit_now(payloads, url=SERVER_API_VERIFY, batch_url=SERVER_API_VERIFY_BATCH, timeout=VERIFY_SUBMIT_TIMEOUT):
+    """Send several verify calls while the caller waits; return ``[(status, error)]`` per payload.
+
+    ``status`` is ``'sent'``, ``'failed'`` when the server refused the item,
+    or ``'queued'`` when the server could not be reached, answered with a
+    transient error or not within ``timeout`` seconds, and the call was
+    left in the outbox. With ``batch_url`` unset the calls go in parallel
+    over the pooled connections.
+    """
+    client = get_verify_client(interactive=True)
+    if batch_url is not None:
+        errors, error = client.post_batch(batch_url, payloads)
+        if errors is None:
+            return [_queue(payload, url, error) for payload in payloads]
+        return [('sent', None) if item_error is None else ('failed', item_error) for item_error in errors]
+
+    # a call not answered by the deadline is queued by the caller, whatever its send does later
+    results = [None] * len(payloads)
+    expired = False
+    lock = threading.Lock()
+
+    def send(position, payload):
+        response, error = client.post(url, payload)
+        with lock:
+            if expired:
+                return
+            if error is None:
+                results[position] = ('sent', None)
+            elif is_permanent_error(response):
+                results[position] = ('failed', error)
+            else:
+                results[position] = _queue(payload, url, error)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(VERIFY_POOL_SIZE, len(payloads))))
+    wait([executor.submit(send, position, payload) for position, payload in enumerate(payloads)], timeout=timeout)
+    with lock:
+        expired = True
+    # a call still running is sent again from the outbox; verify calls are safe to repeat
+    executor.shutdown(wait=False, cancel_futures=True)
+    return [result if result is not None else _queue(payload, url, f"no answer within {timeout:g}s")
+            for payload, result in zip(payloads, results)]
+
+
+def _queue(payload, url, error):
+    submit(payload, url)
+    return 'queued', error
@@ -0,0 +1,75 @@
+import os
+
+import cv2
+
+from controllers.cache import CACHE_DIR, SQLiteStore
+
+VIDEO_METADATA_DB = os.environ.get('VIDEO_METADATA_DB', os.path.join(CACHE_DIR, 'video_metadata.sqlite'))
+
+
+def read_video_metadata(path):
+    """Open ``path`` with OpenCV and return its fps, width, height and frame count."""
+    video = cv2.VideoCapture(path)
+    try:
+        fps = video.get(cv2.CAP_PROP_FPS)
+        width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        if width == 0 or height == 0:
+            # some containers only report the size once a frame is decoded
+            ret, frame = video.read()
+            if not ret:
+                raise ValueError(f'cannot decode {path}')
+            height, width = frame.shape[:2]
+    finally:
+        video.release()
+    return {"fps": fps, "width": width, "height": height, "frame_count": frame_count}
+
+
+class VideoMetadataCache(SQLiteStore):
+    """Persistent fps/size/frame count per MP4, keyed by path, mtime and size.
+
+    Entries live in a small SQLite file so they survive restarts and are
+    shared by all workers; a file is only opened with OpenCV again once it
+    changes on disk.
+    """
+
+    schema = """CREATE TABLE IF NOT EXISTS video_metadata (
+                    path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER,
+                    fps REAL, width INTEGER, height INTEGER, frame_count INTEGER)"""
+
+    def __init__(self, db_path=VIDEO_METADATA_DB):
+        super().__init__(db_path)
+        self._memory = {}
+
+    def lookup(self, path, stat=None):
+        """Cached metadata for the current version of ``path``, or None."""
+        stat = stat or os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._memory.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        row = self.fetchone("SELECT fps, width, height, frame_count FROM video_metadata "
+                            "WHERE path = ? AND mtime_ns = ? AND size = ?", (path, *version))
+        if row is None:
+            return None
+        metadata = dict(zip(("fps", "width", "height", "frame_count"), row))
+        self._memory[path] = (version, metadata)
+        return metadata
+
+    def put(self, path, metadata, stat=None):
+        stat = stat or os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        self.execute("INSERT OR REPLACE INTO video_metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (path, *version, metadata["fps"], metadata["width"], metadata["height"],
+                      metadata["frame_count"]))
+        self._memory[path] = (version, metadata)
+
+    def get(self, path):
+        """Metadata of ``path``, decoding it only if it is not cached yet."""
+        stat = os.stat(path)
+        metadata = self.lookup(path, stat)
+        if metadata is None:
+            metadata = read_video_metadata(path)
+            self.put(path, metadata, stat)
+        return metadata
@@ -0,0 +1,30 @@
+import gc
+import os
+
+# Load the app (and the dashboard case index) once in the master so that
+# workers share it after fork instead of each parsing the json again.
+preload_app = True
+
+# Query state is kept per browser session, so workers can serve requests
+# from several threads.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def when_ready(server):
+    # The layouts are built per request, so importing the app does not load
+    # the index; load it here so the workers inherit it.
+    from controllers.annotation_index import get_annotation_history_index
+    from controllers.case_index import preload_case_index
+    preload_case_index()
+    # the first refresh reads the summary of every annotation file
+    get_annotation_history_index().refresh()
+    # Keep the preloaded objects out of the gc generations so collections in
+    # the workers do not touch (and copy) the shared pages.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Send the reviews left in the verify outbox without waiting for a new one.
+    from controllers.verify_client import start_verify_submitter
+    start_verify_submitter()
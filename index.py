@@ -1,7 +1,13 @@
 import argparse
+import mimetypes
 import re
+import uuid
 
-from flask import send_from_directory
+from flask import abort, jsonify, request, send_file, send_from_directory
+
+from controllers.frame_extractor import FRAME_FORMATS, encode_frame
+from controllers.static_assets import VENDOR_CACHE_TIMEOUT, get_vendor_file
+from controllers.thumbnails import THUMBNAIL_FORMATS, ThumbnailCache
 from views import screen_0
 from views import screen_1
 from views import screen_2
@@ -11,6 +17,9 @@ server = app.server
 
 PLOTLY_LOGO = "https://images.plot.ly/logo/new-branding/plotly-logomark.png"
 ROOT_DICOM_MP4 = os.environ["ROOT_DICOM_MP4"]
+MEDIA_CACHE_TIMEOUT = int(os.environ.get('MEDIA_CACHE_TIMEOUT', 24 * 60 * 60))
+THUMBNAIL_CACHE_TIMEOUT = int(os.environ.get('THUMBNAIL_CACHE_TIMEOUT', 7 * 24 * 60 * 60))
+thumbnails = ThumbnailCache()
 
 NAVBAR = dbc.Navbar(
     children=[
@@ -52,7 +61,7 @@ BODY = html.Div(
               [Input('url', 'pathname')])
 def display_page(pathname):
     if pathname == '/':
-        return screen_0.layout
+        return screen_0.get_layout()
     if re.fullmatch(r'\/case_id=.+[0-9a-zA-Z]', pathname):
         case_id = pathname.replace('/case_id=', '')
         return screen_1.get_layout(case_id)
@@ -66,19 +75,46 @@ def display_page(pathname):
         return '404'
 
 
-@server.route("/data/<path:path>")
-def download(path):
-    """Serve a file from the upload directory."""
-    return send_from_directory('data', path, as_attachment=True)
+@server.route("/vendor/<filename>")
+def load_vendor_asset(filename):
+    """Serve a fingerprinted third-party file, precompressed if the browser accepts it."""
+    vendor_file = get_vendor_file(filename, request.accept_encodings)
+    if vendor_file is None:
+        abort(404)
+    path, encoding = vendor_file
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # the name changes with the content, so the file never needs revalidation
+    response.cache_control.public = True
+    response.cache_control.max_age = VENDOR_CACHE_TIMEOUT
+    response.cache_control.immutable = True
+    return response
 
 
 @server.route("/screen_1/images/<directory>/<filename>")
 def load_thumbnail_screen_1(directory, filename):
-    """Serve a file from the upload directory."""
-    path = os.path.join(ROOT_DICOM_MP4, directory, filename)
-    if not os.path.exists(path):
-        return send_from_directory('./data', 'image-not-found-scaled.png', as_attachment=True)
-    return send_from_directory(os.path.join(ROOT_DICOM_MP4, directory), filename, as_attachment=True)
+    """Serve a card-sized thumbnail, made from the jpg or the first frame of the mp4."""
+    # image/* and */* also match image/webp; only an explicit entry means the browser decodes it
+    accepts_webp = any(mimetype == 'image/webp' and quality > 0 for mimetype, quality in request.accept_mimetypes)
+    fmt = 'webp' if accepts_webp else 'jpeg'
+    path = thumbnails.get(directory, filename, fmt)
+    if path is None:
+        response = send_from_directory('./data', 'image-not-found-scaled.png', as_attachment=True)
+    else:
+        response = send_file(path, mimetype=THUMBNAIL_FORMATS[fmt][2], conditional=True,
+                             cache_timeout=THUMBNAIL_CACHE_TIMEOUT)
+    response.vary.add('Accept')
+    return response
+
+
+def send_media(directory, filename):
+    """Serve a video inline with byte ranges (206), ETag/Last-Modified and conditional GETs."""
+    response = send_from_directory(directory, filename, mimetype='video/mp4', conditional=True,
+                                   cache_timeout=MEDIA_CACHE_TIMEOUT)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
 
 
 @server.route("/screen_2/video/<directory>/<filename>")
@@ -86,11 +122,118 @@ def load_video(directory, filename):
     """Serve a file from the upload directory."""
     path = os.path.join(ROOT_DICOM_MP4, directory, filename)
     if not os.path.exists(path):
-        return send_from_directory('./data', 'sample_video.mp4', as_attachment=True)
-    return send_from_directory(os.path.join(ROOT_DICOM_MP4, directory), filename, as_attachment=True)
-
-
-app.layout = html.Div(children=[NAVBAR, BODY])
+        return send_media('./data', 'sample_video.mp4')
+    return send_media(os.path.join(ROOT_DICOM_MP4, directory), filename)
+
+
+@server.route("/screen_2/frame/<directory>/<filename>/<int:frame>.<fmt>")
+def load_frame(directory, filename, frame, fmt):
+    """Frame ``frame`` (0-based) of a DICOM video as a jpg or png."""
+    if fmt not in FRAME_FORMATS:
+        abort(404)
+    path = screen_2.controller.get_video_file(directory, filename)
+    if path is None:
+        abort(404)
+    etag = f'{os.stat(path).st_mtime_ns}-{frame}'
+    # answer revalidations without decoding
+    if request.if_none_match.contains(etag):
+        response = server.response_class(status=304)
+    else:
+        image = screen_2.controller.frames.get_frame(path, frame)
+        if image is None:
+            abort(404)
+        response = server.response_class(encode_frame(image, fmt), mimetype=FRAME_FORMATS[fmt][2])
+    response.set_etag(etag)
+    response.cache_control.max_age = MEDIA_CACHE_TIMEOUT
+    return response
+
+
+@server.route("/screen_2/filmstrip/<directory>/<filename>")
+def load_filmstrip_index(directory, filename):
+    """Layout of the filmstrip of a video; the sheet is made on the first request."""
+    path = screen_2.controller.get_video_file(directory, filename)
+    if path is None:
+        abort(404)
+    filmstrip = screen_2.controller.filmstrips.ensure(directory, filename)
+    if filmstrip is None:
+        abort(404)
+    version = os.stat(path).st_mtime_ns
+    response = jsonify(dict(filmstrip[1], sprite=f'/screen_2/filmstrip/{directory}/{filename}/sprite.jpg?v={version}'))
+    response.set_etag(str(version))
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@server.route("/screen_2/filmstrip/<directory>/<filename>/sprite.jpg")
+def load_filmstrip_sprite(directory, filename):
+    """Sprite sheet of a video; the index links it with the video version in the query."""
+    if screen_2.controller.get_video_file(directory, filename) is None:
+        abort(404)
+    filmstrip = screen_2.controller.filmstrips.ensure(directory, filename)
+    if filmstrip is None:
+        abort(404)
+    return send_file(filmstrip[0], mimetype='image/jpeg', conditional=True, cache_timeout=MEDIA_CACHE_TIMEOUT)
+
+
+@server.route("/screen_2/annotation/<directory>/<filename>")
+def load_annotation_window(directory, filename):
+    """Packed contours of ``count`` frames from ``start`` of one annotation json."""
+    path = screen_2.controller.get_annotation_path(directory, filename)
+    if path is None:
+        abort(404)
+    start = request.args.get('start', 0, type=int)
+    count = request.args.get('count', 1, type=int)
+    if start < 0 or count < 1:
+        abort(400)
+    etag = f'{os.stat(path).st_mtime_ns}-{start}-{count}'
+    response = jsonify(screen_2.controller.get_annotation_window(path, start, count))
+    # revalidate on every use, the json may be edited in place
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@server.route("/screen_2/overlay/<directory>/<filename>/<int:frame>.png")
+def load_overlay_frame(directory, filename, frame):
+    """One frame of the DICOM video with the contours of an annotation json drawn in."""
+    path = screen_2.controller.get_annotation_path(directory, filename)
+    if path is None:
+        abort(404)
+    image_path = screen_2.controller.overlays.render_frame(path, frame)
+    if image_path is None:
+        abort(404)
+    response = send_file(image_path, mimetype='image/png', conditional=True)
+    # the render is named after the json mtime, so its ETag changes with an edit
+    response.cache_control.no_cache = True
+    return response
+
+
+@server.route("/screen_2/overlay/<directory>/<filename>/clip.mp4")
+def load_overlay_clip(directory, filename):
+    """Preview MP4 of ``count`` frames from ``start`` with the contours drawn in."""
+    path = screen_2.controller.get_annotation_path(directory, filename)
+    if path is None:
+        abort(404)
+    start = request.args.get('start', 0, type=int)
+    count = request.args.get('count', 16, type=int)
+    if start < 0 or count < 1:
+        abort(400)
+    clip_path = screen_2.controller.overlays.render_clip(path, start, count)
+    if clip_path is None:
+        abort(404)
+    response = send_file(clip_path, mimetype='video/mp4', conditional=True)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.cache_control.no_cache = True
+    return response
+
+
+def serve_layout():
+    # Kept in sessionStorage, so the id survives reloads of the same tab.
+    session_store = dcc.Store(id='session-id', storage_type='session', data=str(uuid.uuid4()))
+    return html.Div(children=[session_store, NAVBAR, BODY])
+
+
+app.layout = serve_layout
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='program argument')
@@ -0,0 +1,151 @@
+"""
+Fill the thumbnail, video metadata and annotation summary caches ahead of
+the first reviewer.
+
+    python prescan.py --workers 8
+    python prescan.py --source cases --dashboard $DASHBOARD_FILE_PATH
+
+Files whose cache entries are up to date are skipped, so the scan can be
+interrupted and run again at any time.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import time
+
+from controllers.thumbnails import ROOT_DICOM_MP4, ThumbnailCache
+from controllers.utils import iter_json_array
+from controllers.video_metadata import VideoMetadataCache, read_video_metadata
+
+THUMBNAIL_FORMATS = ('webp', 'jpeg')
+
+thumbnails = None
+
+
+def iter_root_items(root):
+    """Yield ``(directory, stem)`` for every mp4/jpg pair one level below ``root``."""
+    for entry in os.scandir(root):
+        if not entry.is_dir():
+            continue
+        stems = set()
+        for file_entry in os.scandir(entry.path):
+            stem, extension = os.path.splitext(file_entry.name)
+            if extension in ('.mp4', '.jpg') and stem not in stems:
+                stems.add(stem)
+                yield entry.name, stem
+
+
+def iter_case_items(dashboard_path):
+    """Yield ``(directory, stem)`` for every DICOM of the dashboard json."""
+    with io.open(dashboard_path, 'r', encoding="utf8", newline='') as f:
+        for case, _, _ in iter_json_array(f, 'cases'):
+            for dicom in case.get('Dicom', []):
+                yield case['StudyInstanceUID'], dicom['ImagePath']
+
+
+def init_worker(root, cache_dir, width):
+    global thumbnails
+    thumbnails = ThumbnailCache(root=root, cache_dir=cache_dir, width=width)
+
+
+def prescan_item(item):
+    """Build the missing cache entries of one DICOM; runs in a pool worker."""
+    directory, stem, video_stat = item
+    result = {"item": item, "metadata": None, "error": None, "bytes": 0}
+    try:
+        if video_stat is not None:
+            video_path = os.path.join(thumbnails.root, directory, stem + '.mp4')
+            result["metadata"] = read_video_metadata(video_path)
+            result["bytes"] += video_stat.st_size
+        source = thumbnails.get_source(directory, stem + '.jpg')
+        if source is not None:
+            missing = [fmt for fmt in THUMBNAIL_FORMATS
+                       if not os.path.exists(thumbnails.get_variant_path(directory, stem + '.jpg', fmt, source[1]))]
+            if missing:
+                thumbnails.ensure(directory, stem + '.jpg', formats=missing)
+                result["bytes"] += source[1].st_size
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def prescan_annotations():
+    """Store the summary of every annotation file so workers only look them up."""
+    # needs ANNOTATION_JSON_PATH, which the media prescan does not
+    from controllers.annotation_index import AnnotationHistoryIndex
+    start = time.monotonic()
+    history_index = AnnotationHistoryIndex()
+    history_index.refresh()
+    print(f"[prescan] {history_index.version} annotation files summarized in {time.monotonic() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pre-generate thumbnails and video metadata')
+    parser.add_argument('--source', choices=['root', 'cases'], default='root',
+                        help='walk ROOT_DICOM_MP4 or the DICOMs listed in the dashboard json')
+    parser.add_argument('--root', type=str, default=ROOT_DICOM_MP4)
+    parser.add_argument('--dashboard', type=str, default=os.environ.get('DASHBOARD_FILE_PATH', '').strip())
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--report-every', type=float, default=5, help='seconds between progress lines')
+    parser.add_argument('--skip-annotations', action='store_true',
+                        help='do not summarize the files under ANNOTATION_JSON_PATH')
+    args = parser.parse_args()
+
+    metadata_cache = VideoMetadataCache()
+    thumbnail_cache = ThumbnailCache(root=args.root)
+    if args.source == 'cases':
+        items = iter_case_items(args.dashboard)
+    else:
+        items = iter_root_items(args.root)
+
+    # Decide in the parent what is stale so the workers never touch sqlite.
+    pending = []
+    skipped = missing = 0
+    for directory, stem in items:
+        video_stat = None
+        try:
+            stat = os.stat(os.path.join(args.root, directory, stem + '.mp4'))
+            if metadata_cache.lookup(os.path.join(args.root, directory, stem + '.mp4'), stat) is None:
+                video_stat = stat
+        except FileNotFoundError:
+            pass
+        source = thumbnail_cache.get_source(directory, stem + '.jpg')
+        if source is None:
+            missing += 1
+            continue
+        thumbnails_done = all(
+            os.path.exists(thumbnail_cache.get_variant_path(directory, stem + '.jpg', fmt, source[1]))
+            for fmt in THUMBNAIL_FORMATS)
+        if video_stat is None and thumbnails_done:
+            skipped += 1
+        else:
+            pending.append((directory, stem, video_stat))
+    print(f"[prescan] {len(pending)} to process, {skipped} up to date, {missing} without image or video")
+
+    done = failed = processed_bytes = 0
+    start = last_report = time.monotonic()
+    with multiprocessing.Pool(args.workers, initializer=init_worker,
+                              initargs=(args.root, thumbnail_cache.cache_dir, thumbnail_cache.width)) as pool:
+        for result in pool.imap_unordered(prescan_item, pending, chunksize=4):
+            directory, stem, video_stat = result["item"]
+            done += 1
+            processed_bytes += result["bytes"]
+            if result["error"] is not None:
+                failed += 1
+                print(f"[prescan] {directory}/{stem}: {result['error']}")
+            elif result["metadata"] is not None:
+                metadata_cache.put(os.path.join(args.root, directory, stem + '.mp4'), result["metadata"], video_stat)
+            now = time.monotonic()
+            if now - last_report >= args.report_every or done == len(pending):
+                elapsed = now - start
+                print(f"[prescan] {done}/{len(pending)} files, {failed} failed, "
+                      f"{done / elapsed:.1f} files/s, {processed_bytes / elapsed / 2 ** 20:.1f} MB/s")
+                last_report = now
+
+    if not args.skip_annotations and os.environ.get('ANNOTATION_JSON_PATH'):
+        prescan_annotations()
+
+
+if __name__ == '__main__':
+    main()
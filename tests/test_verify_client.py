@@ -0,0 +1,149 @@
+"""
+Verify client and outbox against a stub verify server on localhost.
+
+    python -m unittest tests.test_verify_client
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('SERVER_API_VERIFY', 'http://127.0.0.1:9/verify')
+
+from controllers import verify_client
+from controllers.verify_client import VerifyClient, VerifyOutbox, VerifySubmitter, make_retry, submit_now
+
+
+class StubVerifyServer(ThreadingHTTPServer):
+    """Answers POSTs with the queued ``(status, body)`` replies, then with 200."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubVerifyHandler)
+        self.replies = []
+        self.requests = []
+        self.delay = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/verify'
+
+    def next_reply(self, payload):
+        with self.lock:
+            self.requests.append(payload)
+            return self.replies.pop(0) if self.replies else (200, {"ok": True})
+
+
+class StubVerifyHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        status, body = self.server.next_reply(payload)
+        time.sleep(self.server.delay)
+        data = json.dumps(body).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class VerifyClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubVerifyServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.outbox = VerifyOutbox(os.path.join(self.tmp_dir, 'outbox.sqlite'), max_attempts=5)
+        self.client = VerifyClient(pool_size=2, timeout=(1, 2), retry=make_retry(retries=3, backoff=0))
+        # submit_now queues into this outbox; the submitter is never started so the test drains it
+        verify_client._outbox = self.outbox
+        verify_client._submitter = VerifySubmitter(self.outbox, self.client)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        verify_client._outbox = verify_client._submitter = None
+        shutil.rmtree(self.tmp_dir)
+
+    def get_status(self, id):
+        return self.outbox.fetchone("SELECT status, attempts FROM verify_outbox WHERE id = ?", (id,))
+
+    def test_retries_on_503(self):
+        self.server.replies = [(503, {}), (503, {})]
+        response, error = self.client.post(self.server.url, {"relative_path": "a.json"})
+        self.assertIsNone(error)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_4xx_fails_at_once(self):
+        self.server.replies = [(400, {"error": "bad path"})]
+        id = self.outbox.put(self.server.url, {"relative_path": "a.json"})
+        VerifySubmitter(self.outbox, self.client).drain()
+        self.assertEqual(self.get_status(id), ('failed', 1))
+        # not retried by the client either
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.server.replies = [(404, {})]
+        self.assertEqual(submit_now([{"relative_path": "b.json"}], url=self.server.url, batch_url=None),
+                         [('failed', 'HTTP 404')])
+
+    def test_submit_now_queues_calls_past_the_timeout(self):
+        self.server.delay = 2
+        started = time.monotonic()
+        statuses = submit_now([{"relative_path": "a.json"}, {"relative_path": "b.json"}],
+                              url=self.server.url, batch_url=None, timeout=0.2)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(statuses, [('queued', 'no answer within 0.2s')] * 2)
+        self.assertEqual(len(self.outbox.claim()[1]), 2)
+
+    def test_batch_with_unmatched_results_is_queued(self):
+        self.server.replies = [(200, {"results": [{"ok": True}]})]
+        results, error = self.client.post_batch(self.server.url, [{"relative_path": "a.json"},
+                                                                   {"relative_path": "b.json"}])
+        self.assertIsNone(results)
+        self.assertEqual(error, "1 results for 2 items")
+
+        for answer in ({"ok": True}, ["not", "json", "results"]):
+            self.server.replies = [(200, answer)]
+            self.assertEqual(self.client.post_batch(self.server.url, [{"relative_path": "a.json"}]),
+                             (None, "unparseable batch answer"))
+
+        self.server.replies = [(200, {"results": [{"ok": True}, {"ok": False, "error": "missing"}]})]
+        results, error = self.client.post_batch(self.server.url, [{"relative_path": "a.json"},
+                                                                   {"relative_path": "b.json"}])
+        self.assertEqual(results, [None, "missing"])
+
+    def test_outbox_drains(self):
+        ids = [self.outbox.put(self.server.url, {"relative_path": f"{i}.json"}) for i in range(5)]
+        # the first entry outlasts the client's retries and is sent by a later drain
+        self.server.replies = [(503, {})] * 4
+        submitter = VerifySubmitter(self.outbox, self.client)
+        submitter.drain()
+        self.assertEqual(self.get_status(ids[0]), ('pending', 1))
+        self.assertEqual([self.get_status(id) for id in ids[1:]], [('sent', 1)] * 4)
+
+        self.outbox.execute("UPDATE verify_outbox SET next_attempt = 0")
+        submitter.drain()
+        self.assertEqual(self.get_status(ids[0]), ('sent', 2))
+        self.assertEqual(self.outbox.claim()[1], [])
+        sent = [payload["relative_path"] for payload in self.server.requests[4:]]
+        self.assertEqual(sorted(sent), [f"{i}.json" for i in range(5)])
+
+    def test_claim_is_renewed_before_each_send(self):
+        id = self.outbox.put(self.server.url, {"relative_path": "a.json"})
+        token, entries = self.outbox.claim(lease=-1)
+        self.assertEqual([entry[0] for entry in entries], [id])
+        # the lease ran out and another sender took the entry
+        other_token, _ = self.outbox.claim()
+        self.assertFalse(self.outbox.renew(id, token))
+        self.assertTrue(self.outbox.renew(id, other_token))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,182 +14,86 @@ from dash.dependencies import Input, Output, ALL, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
 
 from app import app
-from controllers.screen_0_controller import PatientCaseController
-from views.view_utils import clip_long_text
-from views.view_components import get_card_info_field, get_filter_options_card, get_multi_color_card_info_field, \
-    get_navigation_bar
+from controllers.screen_0_controller import PatientCaseController, get_card_row
+from views.view_components import get_filter_options_card, get_navigation_bar
 
 controller = PatientCaseController()
 NUM_CARD_PER_PAGE = 8
 
 
-def get_patient_case_card(index, data):
-    id = data['ID']
-    approved = data['NumApproved']
-    rejected = data['NumRejected']
-    annotated_dicom = data['NumAnnotatedDicom']
-    total_dicom = data['NumTotalDicom']
-    annotated_frame = data['NumAnnotatedFrame']
-    total_frame = data['NumTotalFrame']
-    doctor_list = data['DoctorList']
-    last_edit = data['LastEdit']
-    last_review = data['LastReview']
-    hospital = data['Hospital']
-    patient_name = data['PatientName']
-    label = data['Label']
-    # is_done = random.choice([True, False])
-    is_done = data.get('IsDone', "not_check")
-    if is_done == 'check_true':
-        color_file = '#4CAF50'
-    elif is_done == 'check_false':
-        color_file = 'orangered'
-    else:
-        color_file = 'gray'
-
-    label_tooltip = ""
-    label_text = ""
-    label_keys = sorted(list(label.keys()))
-    if len(label.keys()) != 0:
-        label_text = f"{label_keys[0]} - {label[label_keys[0]]} dicoms"
-        for k in label_keys:
-            label_tooltip += f"{k} - {label[k]} dicoms, "
-    if len(label.keys()) > 1:
-        label_text += ", ..."
-
-    if len(doctor_list) != 0:
-        doctor_name = f'{doctor_list[0]}'
-    else:
-        doctor_name = ''
-    if len(doctor_list) > 1:
-        doctor_name += f", {len(doctor_list) - 1} others"
-    card = dbc.Card([
-        html.A([
-            dbc.CardHeader([
-                html.P(f'Case {id}'),
-            ], className='case-info-card-header'),
-        ], href=f'case_id={id}', style={'text-decoration': 'none'}),
-        dbc.CardBody([
-            get_card_info_field(field_id='dicom-info', index=index,
-                                text=f'{annotated_dicom} / {total_dicom} dicoms',
-                                icon="fas fa-pencil-ruler",
-                                tooltip=f"{annotated_dicom} annotated in {total_dicom} total dicoms"),
-            get_multi_color_card_info_field(
-                field_id='review-status-indicator', index=index,
-                spans=[
-                    [f'{approved} / ', 'green'],
-                    [f'{rejected} / ', 'red'],
-                    [f'{total_dicom}', 'default'],
-                ],
-                icon="fa fa-tasks",
-                tooltip=f"{approved} approved {rejected} rejected in {total_dicom} total dicom"),
-            get_card_info_field(field_id='annotated-frame-indicator', index=index,
-                                text=f'{annotated_frame} / {total_frame} frames',
-                                icon="fa fa-pen",
-                                tooltip=f"{annotated_frame} annotated {total_frame} total frames"),
-            get_card_info_field(field_id='doctor-list-indicator', index=index,
-                                text=doctor_name,
-                                icon="fas fa-fw fa-user-md",
-                                tooltip=", ".join(doctor_list)),
-
-            get_card_info_field(field_id='label-list-indicator', index=index,
-                                text=label_text,
-                                icon="fas fa-fw fa-tag",
-                                tooltip=label_tooltip),
-
-            get_card_info_field(field_id='hospital-indicator', index=index,
-                                text=clip_long_text(hospital),
-                                icon="fas fa-fw fa-hospital",
-                                tooltip=hospital),
-            get_card_info_field(field_id='patient-name-indicator', index=index,
-                                text=clip_long_text(patient_name),
-                                icon="fas fa-fw fa-procedures",
-                                tooltip=patient_name),
-            get_card_info_field(field_id='last-edit-indicator', index=index,
-                                text=last_edit,
-                                icon="fas fa-fw fa-history",
-                                tooltip=f"annotated: {last_edit}, review: {last_review}"),
-        ], className='case-info-card-body')
-    ], className='four columns case-info-card',
-        style={'background-color': color_file})
-    return card
-
-
-def get_card_grid(case_data, n_columns=4):
-    n_row = len(case_data) // n_columns
-    grid_case = []
-    for i in range(n_row + 1):
-        grid_case.append(
-            dbc.Row([get_patient_case_card(index=i * n_columns + idx, data=data) for idx, data in
-                     enumerate(case_data[i * n_columns: (i * n_columns + n_columns)])
-                     ])
-        )
-    return [html.Div(grid_case)]
-
-
 """
 # DICOM Review tab
 """
-DICOM_REVIEW_FILTER_PANEL = html.Div(
-    [
-        html.H5('Control Panel'),
-        html.P('Total cases: ' + controller.get_num_total_cases(), id='num-case-indicator'),
-        html.Hr(className="my-2"),
-        html.P('Search for Case:'),
-        dcc.Dropdown(options=[
-            {"label": i, 'value': i}
-            for i in controller.get_case_id_list()
-        ], multi=False, id='case-id-filter'),
-        html.Hr(className="my-2"),
-        html.P('Filter By Doctors:'),
-        dcc.Dropdown(options=[
-            {"label": i, 'value': i}
-            for i in controller.get_doctor_list()
-        ], multi=True, id='doctor-filter'),
-        html.Hr(className="my-2"),
-        html.P('Filter By Hospital:'),
-        dcc.Dropdown(options=[
-            {"label": i, 'value': i}
-            for i in controller.get_hospital_list()
-        ], multi=True, id='hospital-filter'),
-
-        html.Hr(className="my-2"),
-        html.P('Filter By PatientName:'),
-        dcc.Dropdown(options=[
-            {"label": i, 'value': i}
-            for i in controller.get_patient_name_list()
 
-        ], multi=True, id='patient-filter'),
 
-        html.Hr(className="my-2"),
-        html.P('Sort By Field:'),
-        dcc.Dropdown(options=[
-            {"label": i, 'value': i}
-            for i in controller.get_data_fields()
-        ], id='sort-field'),
-        dcc.Checklist(
-            options=[
-                {'label': ' Ascending', 'value': 'ascending'},
-            ],
-            id='sort-mode',
-        ),
-        html.Hr(className="my-2"),
-        get_filter_options_card(filter_options_id='screen0-filter-options'),
-    ],
-)
-
-layout = html.Div(
-    [
-        dcc.Store(id='selected_case_data'),
-        html.Div(id='fade-in'),
-        dbc.Card(DICOM_REVIEW_FILTER_PANEL,
-                 className='three columns pretty_container'),
-        html.Div([get_navigation_bar(screen='screen0')], className='patient-case-page-navigation'),
-        html.Div(id='patient-case-grid', className='eight columns patient-case-grid', ),
+def get_dicom_review_filter_panel():
+    return html.Div(
+        [
+            html.H5('Control Panel'),
+            html.P('Total cases: ' + controller.get_num_total_cases(), id='num-case-indicator'),
+            html.Hr(className="my-2"),
+            html.P('Search for Case:'),
+            dcc.Dropdown(options=[
+                {"label": i, 'value': i}
+                for i in controller.get_case_id_list()
+            ], multi=False, id='case-id-filter'),
+            html.Hr(className="my-2"),
+            html.P('Filter By Doctors:'),
+            dcc.Dropdown(options=[
+                {"label": i, 'value': i}
+                for i in controller.get_doctor_list()
+            ], multi=True, id='doctor-filter'),
+            html.Hr(className="my-2"),
+            html.P('Filter By Hospital:'),
+            dcc.Dropdown(options=[
+                {"label": i, 'value': i}
+                for i in controller.get_hospital_list()
+            ], multi=True, id='hospital-filter'),
+
+            html.Hr(className="my-2"),
+            html.P('Filter By PatientName:'),
+            dcc.Dropdown(options=[
+                {"label": i, 'value': i}
+                for i in controller.get_patient_name_list()
+
+            ], multi=True, id='patient-filter'),
+
+            html.Hr(className="my-2"),
+            html.P('Sort By Field:'),
+            dcc.Dropdown(options=[
+                {"label": i, 'value': i}
+                for i in controller.get_data_fields()
+            ], id='sort-field'),
+            dcc.Checklist(
+                options=[
+                    {'label': ' Ascending', 'value': 'ascending'},
+                ],
+                id='sort-mode',
+            ),
+            html.Hr(className="my-2"),
+            get_filter_options_card(filter_options_id='screen0-filter-options'),
+        ],
+    )
+
+
+def get_layout():
+    return html.Div(
+        [
+            dcc.Store(id='selected_case_data'),
+            # rows of the current page; assets/card_grid.js renders them into patient-case-grid
+            dcc.Store(id='screen0-card-rows'),
+            html.Div(id='screen0-card-grid-output', hidden=True),
+            html.Div(id='fade-in'),
+            dbc.Card(get_dicom_review_filter_panel(),
+                     className='three columns pretty_container'),
+            html.Div([get_navigation_bar(screen='screen0')], className='patient-case-page-navigation'),
+            html.Div(id='patient-case-grid', className='eight columns patient-case-grid', ),
+
+        ],
+        className="twelve columns",
+        style={"marginTop": 30},
+    )
 
-    ],
-    className="twelve columns",
-    style={"marginTop": 30},
-)
 
 """
 # cache variables
@@ -238,22 +142,27 @@ def on_next_prev_page(next, prev, first, last, max_page, current_page_index):
     return current_page_index
 
 
-@app.callback(Output('patient-case-grid', 'children'),
+@app.callback(Output('screen0-card-rows', 'data'),
               [
                   Input('screen0-page-selector', 'value'),
                   Input('screen0-num-page', 'children'),
               ],
-              [State('selected_case_data', 'data')]
+              [
+                  State('selected_case_data', 'data'),
+                  State('session-id', 'data'),
+              ]
               )
-def on_select_page(page, num_page, case_data):
-    case_data = controller.get_selected_case()
+def on_select_page(page, num_page, case_data, session_id):
+    if case_data is None:
+        raise PreventUpdate
     if page is None or page == '':
         page = 0
     else:
         page = int(page)
     page = page - 1
-    return get_card_grid(case_data[page * NUM_CARD_PER_PAGE:
-                                   (page + 1) * NUM_CARD_PER_PAGE])
+    _, page_cases = controller.query_patient_case(case_data['query'], page, NUM_CARD_PER_PAGE,
+                                                  session_id=session_id)
+    return [get_card_row(case) for case in page_cases]
 
 
 @app.callback(
@@ -261,8 +170,9 @@ def on_select_page(page, num_page, case_data):
     [Input('selected_case_data', 'data')]
 )
 def update_page_selection(case_data):
-    case_data = controller.get_selected_case()
-    num_page = len(case_data) // NUM_CARD_PER_PAGE + 1
+    if case_data is None:
+        raise PreventUpdate
+    num_page = case_data['count'] // NUM_CARD_PER_PAGE + 1
     return str(num_page)
 
 
@@ -278,10 +188,11 @@ def update_page_selection(case_data):
         Input('sort-field', 'value'),
         Input('sort-mode', 'value'),
         Input('screen0-filter-options', 'value'),
-    ])
+    ],
+    [State('session-id', 'data')])
 def update_selected_case(selected_case, selected_doctors, selected_hospitals,
                          selected_patients, sorted_field,
-                         sort_mode, filter_options):
+                         sort_mode, filter_options, session_id):
     filters = []
     print(selected_case)
     if selected_case is not None:
@@ -302,12 +213,18 @@ def update_selected_case(selected_case, selected_doctors, selected_hospitals,
             sort_mode = False
         sort = [sorted_field, sort_mode]
 
-    selected_cases = controller.get_patient_case(filters=filters, sort=sort, filter_options=filter_options)
-    total_case_title = 'Total cases: ' + str(len(selected_cases))
-    controller.set_selected_case(selected_cases)
-    return 'updated', total_case_title
+    query = {'filters': filters, 'sort': sort, 'filter_options': filter_options}
+    num_cases, _ = controller.query_patient_case(query, 0, 0, session_id=session_id)
+    total_case_title = 'Total cases: ' + str(num_cases)
+    return {'query': query, 'count': num_cases}, total_case_title
 
 
+app.clientside_callback(
+    ClientsideFunction(namespace='card_grid', function_name='render_cases'),
+    Output('screen0-card-grid-output', 'children'),
+    [Input('screen0-card-rows', 'data')],
+)
+
 app.clientside_callback(
     ClientsideFunction(
         namespace='clientside',
@@ -315,7 +232,6 @@ app.clientside_callback(
     ),
     Output('fade-in', 'children'),
     [
-     Input('screen0-page-selector', 'value'),
-     Input('screen0-num-page', 'children'),
+     Input('screen0-card-grid-output', 'children'),
      ],
 )
@@ -11,194 +11,41 @@ import dash
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output, ALL, State, MATCH
+from dash.dependencies import ClientsideFunction, Input, Output, ALL, State, MATCH
 from dash.exceptions import PreventUpdate
 
 from app import app
-from controllers.screen_1_controller import DicomController
+from controllers.screen_1_controller import DicomController, get_card_row
 from views import screen_2
-from views.view_utils import clip_long_text
-from views.view_components import get_card_with_dropdown, get_card_image_field, get_card_info_field, \
-    get_multi_color_card_info_field, get_filter_options_card, get_navigation_bar
+from views.view_components import get_filter_options_card, get_navigation_bar
 
 controller = DicomController()
 NUM_CARD_PER_PAGE = 30
 
 
-def get_card_header(index, dicom_id, case_id):
-    return html.A([
-        dcc.Store(id={'type': 'screen-1-dicom-data',
-                      'index': index},
-                  data={"dicom_id": dicom_id, "case_id": case_id}),
-        dbc.CardHeader([
-            html.P(f'FileName:{dicom_id}'),
-        ], className='case-info-card-header'),
-    ], id={'type': 'screen-1-card-header',
-           'index': index},
-        style={'text-decoration': 'none'})
-
-
-def get_dicom_card(index, data):
-    # data = clip_long_text(data)
-
-    file_name = data['FileName']
-    annotated_frame = data['NumAnnotatedFrame']
-    total_frame = data['NumTotalFrame']
-    annotated_ef_frame = data['NumAnnotatedEFFrame']
-    annotated_gls_frame = data['NumAnnotatedGLSFrame']
-    annotated_ef_gls_frame = data['NumAnnotatedEFAndGLSFrame']
-    is_done = data['IsDone']
-    doctor_list = data['DoctorList']
-    last_edit = data['LastEdit']
-    label = data['Label']
-    image_path = data['FullImagePath']
-
-    label_tooltip = ""
-
-    if is_done == 'check_true':
-        color_file = '#4CAF50'
-    elif is_done == 'check_false':
-        color_file = 'orangered'
-    else:
-        color_file = 'gray'
-
-    color_doctor = '#388e3c'
-    if len(doctor_list) == 0:
-        doctor_name = ''
-    else:
-        doctor_name = f'{list(doctor_list.keys())[0]}'
-    if len(doctor_list) > 1:
-        doctor_name += f", {len(doctor_list) - 1} others"
-
-    card = dbc.Card([
-        get_card_header(index, file_name, controller.id),
-        dbc.CardBody([
-            get_card_image_field(field_id='screen1-dicom-image', className='dicom-image', index=index,
-                                 image_path=image_path),
-            get_card_info_field(field_id='screen1-dicom-frame-info', index=index,
-                                text=f'{annotated_frame} / {total_frame} frames',
-                                icon="far fa-images",
-                                tooltip=f"{annotated_frame} annotated in {total_frame} total dicoms"),
-            get_card_info_field(field_id='screen1-dicom-ef-info', index=index,
-                                text=f'{annotated_ef_frame} ef / {total_frame} frames',
-                                icon="far fa-images",
-                                tooltip=f"{annotated_ef_frame} annotated ef frames in {total_frame} total dicoms"),
-            get_card_info_field(field_id='screen1-dicom-gls-info', index=index,
-                                text=f'{annotated_gls_frame} gls / {total_frame} frames',
-                                icon="far fa-images",
-                                tooltip=f"{annotated_gls_frame} annotated gls frames in {total_frame} total dicoms"),
-            get_card_info_field(field_id='screen1-dicom-ef-gls-info', index=index,
-                                text=f'{annotated_ef_gls_frame} ef and gls / {total_frame} frames',
-                                icon="far fa-images",
-                                tooltip=f"{annotated_ef_gls_frame} annotated ef and gls frames in {total_frame} total dicoms"),
-
-            get_card_with_dropdown(field_id='screen1-doctor-list-indicator', index=index,
-                                   text=doctor_name,
-                                   hidden_content=doctor_list,
-                                   icon="fas fa-fw fa-user-md",
-                                   tooltip=f"{doctor_name}",
-                                   color=color_doctor),
-
-            get_card_info_field(field_id='label-list-indicator', index=index,
-                                text=label,
-                                icon="fas fa-fw fa-tag",
-                                tooltip=label_tooltip),
-
-            get_card_info_field(field_id='last-edit-indicator', index=index,
-                                text=last_edit,
-                                icon="fas fa-fw fa-history",
-                                tooltip=f"Last annotated: {last_edit}"),
-        ], className='case-info-card-body')
-    ], className='four columns case-info-card',
-        style={'background-color': color_file})
-    return card
-
-
-def get_dicom_image_card(index, data):
-    file_name = data['FileName']
-    total_frame = data['NumTotalFrame']
-    is_done = data['IsDone']
-    doctor_list = data['DoctorList']
-    image_path = data['FullImagePath']
-    # image_path = 'not_found.jpg'
-
-    if is_done == 'check_true':
-        color_file = '#4CAF50'
-    elif is_done == 'check_false':
-        color_file = 'orangered'
-    else:
-        color_file = 'gray'
-
-    if len(doctor_list) == 0:
-        doctor_name = ''
-    else:
-        doctor_name = f'{list(doctor_list.keys())[0]}'
-    if len(doctor_list) > 1:
-        doctor_name += f", {len(doctor_list) - 1} others"
-
-    card = dbc.Card([
-        get_card_header(index, file_name, controller.id),
-        dbc.CardBody([
-            get_card_image_field(field_id='screen1-dicom-image', className='dicom-image', index=index,
-                                 image_path=image_path),
-            get_card_info_field(field_id='screen1-dicom-frame-info', index=index,
-                                text=f'{total_frame} frames',
-                                icon="far fa-images",
-                                tooltip=f"dicom has {total_frame} frames"),
-            dbc.Input(id="screen1-dicom-image-card-input", placeholder="Doctor comment", type="text"),
-
-        ], className='case-info-card-body'),
-    ], className='columns case-image-card',
-        style={'background-color': color_file})
-    return card
-
-
-def get_card_grid(case_data, hide_text_data, n_columns=4):
-    grid_case = []
-    if not hide_text_data:
-        n_row = len(case_data) // n_columns
-        for i in range(n_row + 1):
-            grid_case.append(
-                dbc.Row([get_dicom_card(index=i * n_columns + idx, data=data) for idx, data in
-                         enumerate(case_data[i * n_columns: (i * n_columns + n_columns)])
-                         ])
-            )
-    else:
-        n_columns = 3
-        n_row = len(case_data) // n_columns
-        for i in range(n_row + 1):
-            grid_case.append(
-                dbc.Row([get_dicom_image_card(index=i * n_columns + idx, data=data) for idx, data in
-                         enumerate(case_data[i * n_columns: (i * n_columns + n_columns)])
-                         ])
-            )
-    return [html.Div(grid_case)]
-
-
 """
 # DICOM Review tab
 """
 
 
-def get_dicom_review_filter_panel(id):
-    controller.get_dicom_data(id)
+def get_dicom_review_filter_panel(id, prefix='screen1'):
     return html.Div(
         [
             html.H5('Control Panel'),
-            html.P('Total case: ' + controller.get_num_total_dicoms(), id='screen1-num-dicom-indicator'),
+            html.P('Total case: ' + controller.get_num_total_dicoms(id), id=f'{prefix}-num-dicom-indicator'),
             html.P('Hide Text', id='screen1-hide-text-button', n_clicks=0,
                    className='screen1-hide-text-button'),
             html.Hr(className="my-2"),
             html.P('Filter By Doctors:'),
             dcc.Dropdown(options=[
                 {"label": i, 'value': i}
-                for i in controller.get_doctor_list()
+                for i in controller.get_doctor_list(id)
             ], multi=True, id='screen1-doctor-filter'),
             html.Hr(className="my-2"),
             html.P('Sort By Field:'),
             dcc.Dropdown(options=[
                 {"label": i, 'value': i}
-                for i in controller.get_data_fields()
+                for i in controller.get_data_fields(id)
             ], multi=False, id='screen1-sort-field'),
             dcc.Checklist(
                 options=[
@@ -256,6 +103,19 @@ def get_dicom_review_filter_panel(id):
                             style={"float": "right", "padding-left": "15px", "padding-right": "15px"}),
             ]),
             html.Div(id="screen1-submit-section"),
+            html.Hr(className="my-2"),
+            html.Div([
+                html.P('Bulk Review', id='screen1-num-selected'),
+                dcc.Textarea(
+                    id='screen1-bulk-comment',
+                    value='',
+                    style={'width': '100%'},
+                    placeholder='Note for the selected dicoms',
+                ),
+                html.Button('Accept selected', id='screen1-bulk-accept-button', className='accept-button'),
+                html.Button('Reject selected', id='screen1-bulk-reject-button', className='reject-button'),
+                dcc.Loading(html.Div(id='screen1-bulk-review-status')),
+            ]),
             html.Br(),
             html.Br(),
             html.Hr(className="my-2"),
@@ -264,19 +124,38 @@ def get_dicom_review_filter_panel(id):
     )
 
 
+def get_case_columns(id):
+    return dict(controller.get_case_columns(id), page_size=NUM_CARD_PER_PAGE)
+
+
 def get_layout(id):
-    controller.get_dicom_data(id)
+    # Small cases are queried by the clientside callbacks of assets/screen_1.js.
+    # Their grid, page and count components use the 'screen1-client' ids, so
+    # the server callbacks below, whose outputs are missing, never fire.
+    if controller.is_clientside(id):
+        prefix = 'screen1-client'
+        stores = [dcc.Store(id='screen1-case-columns', data=get_case_columns(id)),
+                  dcc.Store(id='screen1-client-selection')]
+    else:
+        prefix = 'screen1'
+        stores = [dcc.Store(id='screen1-selected_case_data'),
+                  dcc.Store(id='screen1-card-rows')]
     layout = html.Div(
         [
             dcc.Store(id='case_id', data=id),
-            dcc.Store(id='screen1-selected_case_data'),
+            *stores,
             dcc.Store(id='screen1-hide-text-option-data'),
             dcc.Store(id='screen1-hide-text-button-name'),
+            # The cards are html templates of assets/card_grid.js; it types the
+            # opened DICOM and the ticked ones into these inputs.
+            dcc.Input(id='screen1-open-dicom', type='text', style={'display': 'none'}),
+            dcc.Input(id='screen1-selected-dicoms', type='text', value='[]', style={'display': 'none'}),
+            html.Div(id=f'{prefix}-card-grid-output', hidden=True),
 
-            dbc.Card(get_dicom_review_filter_panel(id),
+            dbc.Card(get_dicom_review_filter_panel(id, prefix),
                      className='three columns pretty_container'),
-            html.Div([get_navigation_bar(screen='screen1')], className='patient-case-page-navigation'),
-            html.Div(id='screen1-dicom_grid', className='eight columns dicom-grid'),
+            html.Div([get_navigation_bar(screen=prefix)], className='patient-case-page-navigation'),
+            html.Div(id=f'{prefix}-dicom_grid', className='eight columns dicom-grid'),
             dbc.Modal([
                 # dbc.ModalHeader("Header", id='screen-2-header'),
                 dbc.ModalBody(id='screen-2-body')
@@ -335,22 +214,42 @@ def on_next_prev_page(next, prev, first, last, max_page, current_page_index):
     return current_page_index
 
 
-@app.callback(Output('screen1-dicom_grid', 'children'),
+@app.callback(Output('screen1-card-rows', 'data'),
               [
                   Input('screen1-page-selector', 'value'),
                   Input('screen1-num-page', 'children'),
                   Input('screen1-hide-text-option-data', 'data'),
+                  # reviews change the cards; send the page again after a bulk review or once the modal closes
+                  Input('screen1-bulk-review-status', 'children'),
+                  Input('screen-2', 'is_open'),
               ],
-              [State('screen1-selected_case_data', 'data')]
+              [
+                  State('screen1-selected_case_data', 'data'),
+                  State('session-id', 'data'),
+              ]
               )
-def on_select_page(page, num_page, hide_text_data, case_data):
+def on_select_page(page, num_page, hide_text_data, bulk_review_status, is_screen_2_open, case_data, session_id):
+    if case_data is None or is_screen_2_open:
+        raise PreventUpdate
     if page is None or page == '':
         page = 0
     else:
         page = int(page)
     page = page - 1
-    return get_card_grid(case_data[page * NUM_CARD_PER_PAGE:
-                                   (page + 1) * NUM_CARD_PER_PAGE], hide_text_data)
+    query = case_data['query']
+    _, page_dicoms = controller.query_dicom(query, page, NUM_CARD_PER_PAGE, session_id=session_id)
+    return {
+        "case_id": query['case_id'],
+        "hide_text_data": hide_text_data,
+        "rows": [get_card_row(dicom) for dicom in page_dicoms],
+    }
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='card_grid', function_name='render_dicoms'),
+    Output('screen1-card-grid-output', 'children'),
+    [Input('screen1-card-rows', 'data')],
+)
 
 
 @app.callback(
@@ -358,7 +257,9 @@ def on_select_page(page, num_page, hide_text_data, case_data):
     [Input('screen1-selected_case_data', 'data')]
 )
 def update_page_selection(case_data):
-    num_page = len(case_data) // NUM_CARD_PER_PAGE + 1
+    if case_data is None:
+        raise PreventUpdate
+    num_page = case_data['count'] // NUM_CARD_PER_PAGE + 1
     return str(num_page)
 
 
@@ -393,9 +294,13 @@ def on_change_name_button(data):
         Input('screen1-sort-field', 'value'),
         Input('screen1-sort-mode', 'value'),
         Input('screen1-filter-options', 'value'),
+    ],
+    [
+        State('case_id', 'data'),
+        State('session-id', 'data'),
     ])
 def update_selected_case(selected_doctors, sorted_field,
-                         sort_mode, filter_options):
+                         sort_mode, filter_options, case_id, session_id):
     filters = []
     if sorted_field is not None:
         if sort_mode is None:
@@ -413,35 +318,130 @@ def update_selected_case(selected_doctors, sorted_field,
     if selected_doctors is not None and len(selected_doctors) > 0:
         filters.append(['DoctorList', selected_doctors])
 
-    selected_cases = controller.get_dicom(filters=filters, sort_field=sort_content, filter_options=filter_options)
-    return selected_cases, 'Total case: ' + str(len(selected_cases))
+    query = {'case_id': case_id, 'filters': filters, 'sort_field': sort_content, 'filter_options': filter_options}
+    num_dicoms, _ = controller.query_dicom(query, 0, 0, session_id=session_id)
+    return {'query': query, 'count': num_dicoms}, 'Total case: ' + str(num_dicoms)
 
 
-def get_screen_2_layout(data):
-    click = dash.callback_context.triggered[0]
-    if click['value'] is None:
-        raise PreventUpdate
-    else:
-        index = json.loads(click['prop_id'].split('.')[0])["index"]
-        index = int(index)
-    data = data[index]
-    dicom_id = data["dicom_id"]
-    case_id = data["case_id"]
-    screen_2_layout = screen_2.get_layout(case_id, dicom_id)
-    return screen_2_layout
+def get_selected_dicoms(selected):
+    return json.loads(selected or '[]')
 
 
 @app.callback(
-    Output('screen-2-body', 'children'),
+    Output('screen1-num-selected', 'children'),
+    [Input('screen1-selected-dicoms', 'value')],
+)
+def on_select_dicoms(selected):
+    num_selected = len(get_selected_dicoms(selected))
+    return f'Bulk Review: {num_selected} selected' if num_selected else 'Bulk Review'
+
+
+BULK_REVIEW_COLORS = {'sent': '#388e3c', 'queued': '#f2b600', 'failed': 'red', 'skipped': 'gray'}
+
+
+@app.callback(
+    Output('screen1-bulk-review-status', 'children'),
     [
-        Input({'type': 'screen-1-card-header', 'index': ALL}, 'n_clicks'),
+        Input('screen1-bulk-accept-button', 'n_clicks'),
+        Input('screen1-bulk-reject-button', 'n_clicks'),
     ],
     [
-        State({'type': 'screen-1-dicom-data', 'index': ALL}, 'data'),
+        State('screen1-selected-dicoms', 'value'),
+        State('screen1-bulk-comment', 'value'),
+        State('case_id', 'data'),
     ]
 )
-def display_output(n_clicks, data):
-    return get_screen_2_layout(data)
+def on_bulk_review(accept_clicks, reject_clicks, selected, comment, case_id):
+    ctx = dash.callback_context
+    if not ctx.triggered or ctx.triggered[0]['value'] is None:
+        raise PreventUpdate
+    dicom_ids = get_selected_dicoms(selected)
+    if not dicom_ids:
+        return html.P('No dicom selected')
+    is_accepted = ctx.triggered[0]['prop_id'].split('.')[0] == 'screen1-bulk-accept-button'
+    results = controller.bulk_review(case_id, dicom_ids, is_accepted=is_accepted, comment=comment)
+    return html.Ul([
+        html.Li(f"{dicom_id}: {status}" + (f" ({message})" if message else ""),
+                style={'color': BULK_REVIEW_COLORS[status]})
+        for dicom_id, status, message in results
+    ])
+
+
+@app.callback(
+    Output('screen1-case-columns', 'data'),
+    [
+        Input('screen1-bulk-review-status', 'children'),
+        Input('screen-2', 'is_open'),
+    ],
+    [State('case_id', 'data')],
+    prevent_initial_call=True,
+)
+def refresh_case_columns(bulk_review_status, is_screen_2_open, case_id):
+    # reviews change the cards; send the columns again after a bulk review or once the modal closes
+    if is_screen_2_open:
+        raise PreventUpdate
+    return get_case_columns(case_id)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='screen_1', function_name='select_dicoms'),
+    [
+        Output('screen1-client-selection', 'data'),
+        Output('screen1-client-num-dicom-indicator', 'children'),
+    ],
+    [
+        Input('screen1-doctor-filter', 'value'),
+        Input('screen1-sort-field', 'value'),
+        Input('screen1-sort-mode', 'value'),
+        Input('screen1-filter-options', 'value'),
+        Input('screen1-case-columns', 'data'),
+    ],
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='screen_1', function_name='update_num_page'),
+    Output('screen1-client-num-page', 'children'),
+    [Input('screen1-client-selection', 'data')],
+    [
+        State('screen1-case-columns', 'data'),
+        State('screen1-client-num-page', 'children'),
+    ],
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='screen_1', function_name='on_next_prev_page'),
+    Output('screen1-client-page-selector', 'value'),
+    [
+        Input('screen1-client-first-page-button', 'n_clicks'),
+        Input('screen1-client-next-page-button', 'n_clicks'),
+        Input('screen1-client-prev-page-button', 'n_clicks'),
+        Input('screen1-client-last-page-button', 'n_clicks'),
+        Input('screen1-client-num-page', 'children'),
+    ],
+    [State('screen1-client-page-selector', 'value')],
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='screen_1', function_name='render_page'),
+    Output('screen1-client-card-grid-output', 'children'),
+    [
+        Input('screen1-client-page-selector', 'value'),
+        Input('screen1-client-selection', 'data'),
+        Input('screen1-hide-text-option-data', 'data'),
+    ],
+    [State('screen1-case-columns', 'data')],
+)
+
+
+@app.callback(
+    Output('screen-2-body', 'children'),
+    [Input('screen1-open-dicom', 'value')],
+)
+def display_output(opened):
+    if not opened:
+        raise PreventUpdate
+    opened = json.loads(opened)
+    return screen_2.get_layout(opened['case_id'], opened['dicom_id'])
 
 
 @app.callback(
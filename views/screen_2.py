@@ -86,7 +86,14 @@ VIDEO_CONTROL_BAR = [
         [
             VIDEO_CONTROL_BUTTON,
             html.Hr(className="video-control-divider"),
-            html.Div(id="slider-placeholder"),
+            html.Div(
+                [
+                    # frame preview from the filmstrip while hovering the slider
+                    html.Div(id="filmstrip-preview", className="filmstrip-preview", hidden=True),
+                    html.Div(id="slider-placeholder"),
+                ],
+                className="frame-slider",
+            ),
         ],
         style={"margin": "1%"},
     ),
@@ -104,6 +111,8 @@ def get_video_viewer(video_url, height, width):
                     autoPlay=True,
                     loop=True,
                 ),
+                # server-decoded still of the current frame, shown while stepping
+                html.Img(id='frame-image', className='frame-image', hidden=True),
                 html.Canvas(id='annotation-canvas', height=height, width=width),
             ], className='video-player', id="video-player-placeholder"
         ),
@@ -121,7 +130,10 @@ def get_layout(case_id, dicom_id):
             html.Div(id="current-frame-index"),
             dcc.Store(id='annotation-json'),
             dcc.Store(id='frame-rate'),
+            dcc.Store(id='frame-source'),
             dcc.Store(id="json-path", data=dicom_id),
+            dcc.Store(id="video-path", data=mp4_file),
+            dcc.Store(id="dicom-key", data={"case_id": case_id, "dicom_id": dicom_id}),
             html.Div([
                 get_history_review_panel(history),
                 get_dicom_quality_panel(),
@@ -148,6 +160,7 @@ def get_layout(case_id, dicom_id):
 @app.callback(
     [
         Output('frame-rate', 'data'),
+        Output('frame-source', 'data'),
         Output('annotation-json', "data"),
         Output('json-path', "data"),
         Output('dicom-viewer-placeholder', "children"),
@@ -160,15 +173,15 @@ def on_choose_dicom_history(data):
         raise PreventUpdate
     data = json.loads(data)
     video_url = data["mp4"]
-    annotation_data = json.load(open(data["json_path"], 'r'))
     json_path = data["json_path"]
+    annotation_data = controller.get_annotation_header(json_path)
     fps, height, width = controller.get_frame_rate_and_width_height(video_url)
     video_viewer = dcc.Loading([
         dbc.Card(get_video_viewer(video_url, height, width),
                  className="video_viewer_section"),
         dbc.Card(VIDEO_CONTROL_BAR, className="video_control_section"),
     ])
-    return fps, annotation_data, json_path, video_viewer
+    return fps, controller.get_frame_source(video_url), annotation_data, json_path, video_viewer
 
 
 @app.callback(
@@ -240,9 +253,10 @@ def select_reject_reasons(rating_value):
     [
         State("json-path", 'data'),
         State("annotation-comment", 'data'),
+        State("dicom-key", 'data'),
     ]
 )
-def on_reject_accept_click(reject_click, accept_click, json_path, comment):
+def on_reject_accept_click(reject_click, accept_click, json_path, comment, dicom_key):
     ctx = dash.callback_context
     if not ctx.triggered:
         button_id = 'No clicks yet'
@@ -250,17 +264,19 @@ def on_reject_accept_click(reject_click, accept_click, json_path, comment):
         button_id = ctx.triggered[0]['prop_id'].split('.')[0]
 
     if button_id == "reject-button":
-        return_status = controller.annotation_submit(json_path=json_path, is_accepted=False, comment=comment)
+        return_status = controller.annotation_submit(json_path=json_path, is_accepted=False, comment=comment,
+                                                     **dicom_key)
         if return_status:
-            return ["Submit to server successfully! status: Rejected"]
+            return ["Submitted, status: Rejected"]
         else:
             return html.Div(["Server error"], style={
                 "color": "red"
             })
     elif button_id == "accept-button":
-        return_status = controller.annotation_submit(json_path=json_path, is_accepted=True, comment=comment)
+        return_status = controller.annotation_submit(json_path=json_path, is_accepted=True, comment=comment,
+                                                     **dicom_key)
         if return_status:
-            return ["Submit to server successfully! status: Accept"]
+            return ["Submitted, status: Accept"]
         else:
             return html.Div(["Server error"], style={
                 "color": "red"
@@ -274,13 +290,14 @@ def on_reject_accept_click(reject_click, accept_click, json_path, comment):
     ], [
         State('quality-star-rating', "value"),
         State('quality-comment', "value"),
+        State('video-path', "data"),
     ]
 )
-def on_quality_submit(n_clicks, rating, comment):
+def on_quality_submit(n_clicks, rating, comment, video_path):
     if n_clicks is None:
         raise PreventUpdate
     rating = 6 - int(rating)
-    return_status = controller.quality_submit(rating=rating, comment=comment)
+    return_status = controller.quality_submit(video_path=video_path, rating=rating, comment=comment)
     if return_status:
         return ["Submit to server successfully!"]
     else:
@@ -314,7 +331,7 @@ app.clientside_callback(
     ),
     Output('temp', 'children'),
     [Input('annotation-json', 'data')],
-    [State('frame-rate', 'data')]
+    [State('frame-rate', 'data'), State('frame-source', 'data')]
 )
 app.clientside_callback(
     ClientsideFunction(
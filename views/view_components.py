@@ -8,85 +8,6 @@ from app import app
 from controllers.screen_1_controller import DicomController
 import base64
 
-def get_card_with_dropdown(field_id, index, text, hidden_content, icon, tooltip, color):
-    line = html.Div([
-        html.Hr(),
-        html.Div([
-            html.I(className=icon),
-            html.P(text,
-                   className="card-text-info",
-                   style={'color': color},
-                   ),
-            html.Div([
-                html.P(f'{key}: {len(hidden_content[key])} times') for key in hidden_content.keys()
-            ], className="dropdown-content")
-        ], id=f'{field_id}-{index}', className='dropdown'),
-    ])
-    return line
-
-
-def get_card_info_field(field_id, index, text, icon, tooltip, color="black"):
-    return html.Div([
-        html.Hr(),
-        html.Div([
-            html.I(className=icon),
-            html.P(text,
-                   className="card-text-info",
-                   style={'color': color},
-                   ),
-        ], id=f'{field_id}-{index}'),
-        dbc.Tooltip(
-            tooltip,
-            target=f"{field_id}-{index}",
-            style={
-                "visibility": "visible",
-                "position": "relative",
-                "font-size": '14px',
-            }
-        ),
-    ])
-
-
-def get_card_image_field(field_id, className, index, image_path):
-    path = '/screen_1/images/' + image_path
-    line = html.Div([
-        html.Div([
-            html.Img(src=path, id=f'{field_id}', className=f'{className}'),
-        ], id=f'{field_id}-{index}')
-    ])
-    return line
-
-    # ## test man
-    # path = image_path
-    # line = html.Div([
-    #     html.Div([
-    #         html.Img(src=path, id=f'{field_id}', className=f'{className}'),
-    #     ], id=f'{field_id}-{index}')
-    # ])
-    # return line
-
-
-def get_multi_color_card_info_field(field_id, index, spans, icon, tooltip):
-    color_text = html.Div([html.P(text, style={'color': color},
-                                  className="card-text-info") for text, color in spans],
-                          style={'display': 'inline'})
-    line = html.Div([
-        html.Hr(),
-        html.Div([
-            html.I(className=icon),
-            color_text,
-        ], id=f'{field_id}-{index}'),
-        dbc.Tooltip(
-            tooltip,
-            target=f"{field_id}-{index}",
-            style={
-                "font-size": '14px',
-                "background-color": "#f00"
-            }
-        ),
-    ])
-    return line
-
 
 def get_filter_options_card(filter_options_id):
     return dcc.RadioItems(